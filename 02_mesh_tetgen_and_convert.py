@@ -6,11 +6,56 @@
 # Python Version: 3.10
 # version ='1.0'
 # ----------------------------------------------------------------------------
-import copy
+import bisect
+from collections.abc import Mapping, Sequence
+from contextlib import ExitStack, nullcontext
+from functools import cached_property
+import hashlib
+import json
+import mmap
+import multiprocessing
+import re
+import shutil
 import subprocess
+import sys
 import os
+import time
 from pathlib import Path
 
+import numpy as np
+
+COORD_DTYPE = np.float64
+INDEX_DTYPE = np.int32
+
+# Number of nodes per gmsh element type
+GMSH_NODES_PER_TYPE = {1: 2, 2: 3, 3: 4, 4: 4, 5: 8, 6: 6, 7: 5, 8: 3, 9: 6, 11: 10, 15: 1}
+# Dimension per gmsh element type
+GMSH_DIMENSION_PER_TYPE = {1: 1, 2: 2, 3: 2, 4: 3, 5: 3, 6: 3, 7: 3, 8: 1, 9: 2, 11: 3, 15: 0}
+# Supported gmsh file format versions
+GMSH_VERSIONS = ("2.2", "4.1")
+# devsim element type of the in-memory create_gmsh_mesh per gmsh element type
+DEVSIM_TYPE_PER_GMSH_TYPE = {15: 0, 1: 1, 2: 2, 4: 3}
+
+# Rows formatted per write call of the bulk writers
+WRITE_CHUNK_ROWS = 100000
+# Age in seconds after which a staging directory of MeshCache.store is left over from a process that died
+CACHE_STAGING_SECONDS = 3600
+# Bytes per part in which GmshIndex scans ASCII sections
+LAZY_CHUNK_BYTES = 1 << 22
+# Parts per section of the parallel readers, enough to balance the workers, each between 1 MiB and
+# PARSE_CHUNK_BYTES in size
+PARSE_CHUNKS = 64
+PARSE_CHUNK_BYTES = 1 << 24
+
+# Minimum number of columns per TetGen file from its header line
+TETGEN_COLUMNS = {
+    ".node": lambda header: 1 + header[1] + header[2] + header[3],  # id, coords, attributes, boundary marker
+    ".face": lambda header: 1 + 3 + header[1],  # id, nodes, boundary marker
+    ".ele": lambda header: 1 + header[1] + header[2],  # id, nodes, region attributes
+    ".edge": lambda header: 1 + 2 + header[1],  # id, nodes, boundary marker
+    ".neigh": lambda header: 1 + header[1],  # id, neighbour tetrahedra
+}
+
 
 # Factory Functions ----------------------------------------------------------
 def create_element(mesh_type: str, line: str, config: dict = None) -> dict:
@@ -103,275 +148,2038 @@ def create_physical_name(line: str) -> dict:
     return {"dim": dim, "id": id, "name": name}
 
 
+def nodes_from_records(nodes: list) -> tuple:
+    """
+    Converts a list of node dictionaries (see create_node) into arrays
+    :param nodes: list of node dictionaries
+    :return: ids (N,), coords (N, 3), attributes (N, k)
+    """
+    ids = np.array([node["id"] for node in nodes], dtype=INDEX_DTYPE)
+    coords = _table([node["coords"] for node in nodes], COORD_DTYPE, 3)
+    attributes = _table([node.get("tags", []) for node in nodes], COORD_DTYPE)
+    return ids, coords, attributes
+
+
+def integer_tags(tags: np.ndarray, name: str) -> np.ndarray:
+    """
+    gmsh tags are int32. TetGen region attributes (-A) are kept as float64, they are integers unless set to
+    other numbers by a region list. Non-integer attributes would be truncated and are rejected.
+    :param tags: tags of one ElementBlock, shape (n, k)
+    :param name: source of the tags for the error message
+    """
+    tags = np.asarray(tags)
+    if tags.dtype.kind == "f":
+        fractional = tags != np.round(tags)
+        if fractional.any():
+            raise ValueError(f"Non-integer region attribute in {name}! Expected:integer, "
+                             f"Value:{tags[fractional][0]}")
+    return tags.astype(INDEX_DTYPE)
+
+
+def tetgen_tag_count(block) -> int:
+    """
+    :return: number of boundary markers / region attributes in the header of a TetGen file. Tags of gmsh
+             elements are appended as extra columns without being announced in the header.
+    """
+    return block.tags.shape[1] if block.mesh_type == "tetgen" else 0
+
+
+def tag_format(block) -> str:
+    """
+    :return: printf format of the tags of block, region attributes are written with all digits
+    """
+    return "%d" if np.issubdtype(block.tags.dtype, np.integer) else "%.17g"
+
+
+def blocks_from_records(elements: list) -> list:
+    """
+    Groups a list of element dictionaries (see create_element) by type into ElementBlocks
+    :param elements: list of element dictionaries
+    :return: list of ElementBlock in order of first appearance of the type
+    """
+    grouped = {}
+    for element in elements:
+        grouped.setdefault(element["type"], []).append(element)
+    return [ElementBlock.from_records(type, records) for type, records in grouped.items()]
+
+
+def merge_blocks(blocks: list) -> list:
+    """
+    Concatenates ElementBlocks of the same type, e.g. parsed from consecutive parts of a file. Tags are padded
+    with 0 to the largest tag count of the type.
+    :return: list of ElementBlock in order of first appearance of the type
+    """
+    grouped = {}
+    for block in blocks:
+        grouped.setdefault(block.type, []).append(block)
+    merged = []
+    for type, parts in grouped.items():
+        if len(parts) == 1:
+            merged.append(parts[0])
+            continue
+        tag_count = max(part.tags.shape[1] for part in parts)
+        tags = [np.pad(part.tags, ((0, 0), (0, tag_count - part.tags.shape[1]))) for part in parts]
+        merged.append(ElementBlock(type, np.concatenate([part.ids for part in parts]),
+                                   np.concatenate([part.nodes for part in parts]),
+                                   np.concatenate(tags), parts[0].mesh_type))
+    return merged
+
+
+def read_tetgen_file(file_name: str, pool=None) -> tuple:
+    """
+    Reads a TetGen .node/.face/.ele/.edge/.neigh file. The body is parsed in a single bulk pass into an array,
+    comments starting with # are removed beforehand. Extra columns (e.g. from -nn) are kept.
+    :param file_name: path including the suffix
+    :param pool: worker pool (see parallel_pool) to parse the body in line-aligned parts, the file is memory
+                 mapped instead of read
+    :return: header as list of int (padded with zeros), body as array with one row per entry
+    """
+    suffix = Path(file_name).suffix
+    with open(file_name, "rb") as fh, (nullcontext(fh.read()) if pool is None else
+                                       mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)) as data:
+        if pool is None and b"#" in data:
+            data = re.sub(rb"#[^\n]*", b"", data)
+        header_line = re.compile(rb"^[ \t\r]*([^\s#][^\n#]*)", re.MULTILINE).search(data)
+        if header_line is None:
+            raise ValueError(f"No header found in {file_name}")
+        header = [int(value) for value in header_line.group(1).split()]
+        header += [0] * (4 - len(header))
+        count, columns = header[0], TETGEN_COLUMNS[suffix](header)
+
+        # integer parsing is a lot faster, floats only occur in node coordinates and region attributes
+        dtype = COORD_DTYPE if suffix == ".node" or (suffix == ".ele" and header[2]) else np.int64
+        if pool is None:
+            body = np.fromstring(data[header_line.end():], dtype=dtype, sep=" ")
+        else:
+            # the first part starts behind the header values like the serial parse, the rest of the header
+            # line is whitespace or a comment
+            kind = "float" if dtype is COORD_DTYPE else "int"
+            parts = parse_parallel(pool, file_name, data, header_line.end(), len(data), kind)
+            body = np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+    if count == 0 and body.size == 0:
+        return header, body.reshape(0, columns)
+    if count == 0 or body.size % count or body.size // count < columns:
+        raise ValueError(f"Body of {file_name} does not match header! Expected: {count} rows with at least "
+                         f"{columns} columns, Value: {body.size} numbers")
+    return header, body.reshape(count, -1)
+
+
+def gmsh_sections(data) -> dict:
+    """
+    Locates the $Section ... $EndSection blocks of a gmsh file without parsing them
+    :param data: file content as bytes (or mmap)
+    :return: {name: (start, end)} byte offsets of each section body
+    """
+    sections = {}
+    position = data.find(b"$")
+    while position != -1:
+        line_end = data.find(b"\n", position)
+        name = bytes(data[position + 1:line_end]).strip()
+        end = data.find(b"$End" + name, line_end)
+        if end == -1:
+            raise ValueError(f"Section ${name.decode()} is not terminated")
+        sections[name.decode()] = (line_end + 1, end)
+        position = data.find(b"$", end + len(name) + 4)
+    return sections
+
+
+def line_ranges(data, start: int, end: int, chunk_bytes: int) -> list:
+    """
+    Splits data[start:end] into byte ranges of about chunk_bytes that end after a newline
+    :param data: bytes or mmap
+    :return: list of (start, end)
+    """
+    ranges = []
+    while start < end:
+        stop = data.find(b"\n", min(start + chunk_bytes, end) - 1, end)
+        stop = end if stop == -1 else stop + 1
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def parse_text_range(file_name: str, start: int, end: int, kind: str):
+    """
+    Worker of the parallel readers, parses the lines in bytes start ... end of a text file.
+    The range is read by the worker itself, only the parsed arrays are sent back.
+    :param kind: "float" or "int" for a flat array of all values, "elements" for gmsh 2.2 element rows
+    :return: flat array or list of ElementBlock (see parse_gmsh_element_rows)
+    """
+    with open(file_name, "rb") as fh:
+        fh.seek(start)
+        data = fh.read(end - start)
+    if kind == "elements":
+        return parse_gmsh_element_rows(data)
+    if b"#" in data:
+        data = re.sub(rb"#[^\n]*", b"", data)
+    return np.fromstring(data, dtype=COORD_DTYPE if kind == "float" else np.int64, sep=" ")
+
+
+def parse_parallel(pool, file_name: str, data, start: int, end: int, kind: str) -> list:
+    """
+    Splits the lines in bytes start ... end of a file into line-aligned ranges and parses them in pool
+    :param data: content of the file, bytes or mmap, only used to find line ends
+    :return: results of parse_text_range in order of the ranges
+    """
+    chunk_bytes = max(1 << 20, min(PARSE_CHUNK_BYTES, (end - start) // PARSE_CHUNKS + 1))
+    ranges = line_ranges(data, start, end, chunk_bytes)
+    return pool.starmap(parse_text_range, [(file_name, range_start, range_end, kind)
+                                           for range_start, range_end in ranges])
+
+
+def parallel_pool(processes: int):
+    """
+    Worker pool of the parallel readers, workers are spawned and import this module again
+    """
+    return multiprocessing.get_context("spawn").Pool(processes)
+
+
+def split_count(body) -> tuple:
+    """
+    Splits the leading count line off a section body
+    :param body: bytes or memoryview, a memoryview is split without copying
+    :return: count, rest of the body
+    """
+    line_end = bytes(body[:64]).find(b"\n")
+    if line_end == -1:
+        line_end = len(body)
+    return int(bytes(body[:line_end])), body[line_end + 1:]
+
+
+def split_rows(data: bytes, dtype=np.int64) -> tuple:
+    """
+    Parses whitespace separated rows of differing length in one bulk pass
+    :param data: rows separated by newlines
+    :param dtype: dtype of the values
+    :return: flat values, index of the first value of each row, number of values per row
+    """
+    values = np.fromstring(data, dtype=dtype, sep=" ")
+    chars = np.frombuffer(data, dtype=np.uint8)
+    blank = chars <= ord(" ")
+    token_starts = np.flatnonzero(~blank & np.concatenate(([True], blank[:-1])))
+    if len(token_starts) != len(values):
+        raise ValueError(f"Could not parse all values! Expected:{len(token_starts)}, Value:{len(values)}")
+    # a row starts with the first token after a newline, empty lines map onto the same token
+    row_starts = np.searchsorted(token_starts, np.flatnonzero(chars == ord("\n")))
+    row_starts = row_starts[(np.diff(row_starts, prepend=0) > 0) & (row_starts < len(values))]
+    row_starts = np.concatenate(([0], row_starts)) if len(values) else row_starts
+    row_lengths = np.diff(row_starts, append=len(values))
+    return values, row_starts, row_lengths
+
+
+def parse_gmsh_nodes(body: bytes) -> tuple:
+    """
+    Parses the body of a gmsh 2.2 ASCII $Nodes section
+    :return: node_count, ids (N,), coords (N, 3)
+    """
+    count, rows = split_count(body)
+    values = np.fromstring(bytes(rows), dtype=COORD_DTYPE, sep=" ")
+    if values.size != 4 * count:
+        raise ValueError(f"Node counts do not match! Expected:{count}, Value:{values.size / 4}")
+    values = values.reshape(count, 4)
+    return count, values[:, 0].astype(INDEX_DTYPE), np.ascontiguousarray(values[:, 1:])
+
+
+def parse_gmsh_elements(body: bytes) -> tuple:
+    """
+    Parses the body of a gmsh 2.2 ASCII $Elements section
+    :return: element_count, list of ElementBlock in order of first appearance of the type
+    """
+    count, rows = split_count(body)
+    blocks = parse_gmsh_element_rows(bytes(rows))
+    row_count = sum(len(block) for block in blocks)
+    if row_count != count:
+        raise ValueError(f"Element counts do not match! Expected:{count}, Value:{row_count}")
+    return count, blocks
+
+
+def parse_gmsh_element_rows(rows: bytes) -> list:
+    """
+    Parses element rows of a gmsh 2.2 ASCII $Elements section. Rows are grouped by element type,
+    each group is gathered from the flat values with a single index operation. Elements of one type may have
+    different numbers of tags (e.g. partitioned meshes), the tags are padded with 0 to the largest count.
+    :return: list of ElementBlock in order of first appearance of the type
+    """
+    values, row_starts, row_lengths = split_rows(rows)
+    types = values[row_starts + 1]
+    unique_types, first_rows = np.unique(types, return_index=True)
+    blocks = []
+    for type in unique_types[np.argsort(first_rows)]:
+        starts = row_starts[types == type]
+        tag_counts = values[starts + 2]
+        node_counts = row_lengths[types == type] - 3 - tag_counts
+        node_count = node_counts[0]
+        if np.any(node_counts != node_count):
+            raise ValueError(f"Elements of type {type} have differing node counts")
+        tag_columns = np.arange(tag_counts.max())
+        present = tag_columns < tag_counts[:, None]
+        tags = np.where(present, values[np.where(present, starts[:, None] + 3 + tag_columns, 0)], 0)
+        nodes = values[(starts + 3 + tag_counts)[:, None] + np.arange(node_count)]
+        blocks.append(ElementBlock(int(type), values[starts], nodes, tags))
+    return blocks
+
+
+def write_table(fh, row_format: str, columns: list, stats: dict = None, chunk_rows: int = WRITE_CHUNK_ROWS):
+    """
+    Writes one line per row of the column arrays. Chunks of rows are formatted into a single buffer
+    with one % operation and written with one fh.write call.
+    :param fh: text file handle
+    :param row_format: printf style format of a single line
+    :param columns: arrays (1D or 2D) with the same number of rows, written side by side
+    :param stats: optional dictionary, rows, bytes, seconds and peak_buffer_bytes are accumulated into it
+    :param chunk_rows: number of rows per buffer
+    """
+    start_time = time.perf_counter()
+    columns = [np.asarray(column) for column in columns]
+    rows = len(columns[0])
+    integer = all(np.issubdtype(column.dtype, np.integer) for column in columns)
+    written, peak = 0, 0
+    for start in range(0, rows, chunk_rows):
+        chunk = [column[start:start + chunk_rows].reshape(min(chunk_rows, rows - start), -1) for column in columns]
+        if integer:
+            values = np.hstack(chunk).astype(np.int64)
+        else:  # object array keeps python int and float for the matching format codes
+            values = np.empty((len(chunk[0]), sum(part.shape[1] for part in chunk)), dtype=object)
+            column_start = 0
+            for part in chunk:
+                values[:, column_start:column_start + part.shape[1]] = part
+                column_start += part.shape[1]
+        buffer = (row_format * len(values)) % tuple(values.ravel().tolist())
+        fh.write(buffer)
+        written += len(buffer)
+        peak = max(peak, len(buffer))
+    if stats is not None:
+        stats["rows"] = stats.get("rows", 0) + rows
+        stats["bytes"] = stats.get("bytes", 0) + written
+        stats["seconds"] = stats.get("seconds", 0.0) + time.perf_counter() - start_time
+        stats["peak_buffer_bytes"] = max(stats.get("peak_buffer_bytes", 0), peak)
+
+
+class FanOut:
+    """
+    File-like object that passes every write on to several file handles, a buffer formatted once ends up in all
+    """
+    def __init__(self, handles: list):
+        self.handles = handles
+
+    def write(self, data):
+        for fh in self.handles:
+            fh.write(data)
+        return len(data)
+
+
+def parse_gmsh_nodes_binary(body, byte_order: str = "<") -> tuple:
+    """
+    Parses the body of a gmsh 2.2 binary $Nodes section, records of int32 id and 3 float64 coords.
+    The arrays are views into body, nothing is copied for native byte order.
+    :return: node_count, ids (N,), coords (N, 3)
+    """
+    count, payload = split_count(body)
+    record = np.dtype([("id", byte_order + "i4"), ("coords", byte_order + "f8", (3,))])
+    if len(payload) < count * record.itemsize:
+        raise ValueError(f"Binary node section too short for {count} nodes")
+    nodes = np.frombuffer(payload, dtype=record, count=count)
+    return count, nodes["id"].astype(INDEX_DTYPE, copy=False), nodes["coords"].astype(COORD_DTYPE, copy=False)
+
+
+def parse_gmsh_elements_binary(body, byte_order: str = "<") -> tuple:
+    """
+    Parses the body of a gmsh 2.2 binary $Elements section. Each block starts with the int32 header
+    type, number of elements, number of tags followed by the int32 rows id, tags, nodes. Blocks of the same
+    type are concatenated like the ASCII elements, the arrays of a type with a single block are views into body,
+    nothing is copied for native byte order.
+    :return: element_count, list of ElementBlock in order of first appearance of the type
+    """
+    count, payload = split_count(body)
+    header_dtype = np.dtype(byte_order + "i4")
+    blocks, position, read = [], 0, 0
+    while read < count:
+        type, block_count, tag_count = (int(value) for value in
+                                        np.frombuffer(payload, dtype=header_dtype, count=3, offset=position))
+        position += 3 * header_dtype.itemsize
+        columns = 1 + tag_count + GMSH_NODES_PER_TYPE[type]
+        rows = np.frombuffer(payload, dtype=header_dtype, count=block_count * columns, offset=position)
+        rows = rows.reshape(block_count, columns).astype(INDEX_DTYPE, copy=False)
+        blocks.append(ElementBlock(type, rows[:, 0], rows[:, 1 + tag_count:], rows[:, 1:1 + tag_count]))
+        position += rows.nbytes
+        read += block_count
+    return count, merge_blocks(blocks)
+
+
+class SectionReader:
+    """
+    Sequential reader of the values of a gmsh 4.1 section. ASCII bodies are parsed in one bulk pass into a flat
+    array of tokens, binary bodies are read in place with the dtype of each field ("size": size_t, "int": int,
+    "double": double). Entity blocks are consumed as whole arrays, only the block headers are read one by one.
+    :param body: section body, bytes or memoryview
+    :param binary: body is gmsh binary (file-type 1)
+    :param byte_order: "<" or ">" for binary bodies
+    :param dtype: dtype of the ASCII tokens, int64 is a lot faster to parse if the section has no floats
+    """
+    DTYPES = {"size": "u8", "int": "i4", "double": "f8"}
+
+    def __init__(self, body, binary: bool = False, byte_order: str = "<", dtype=COORD_DTYPE):
+        self.binary = binary
+        self.byte_order = byte_order
+        self.data = body if binary else np.fromstring(bytes(body), dtype=dtype, sep=" ")
+        self.position = 0
+
+    def read(self, kind: str, count: int = 1) -> np.ndarray:
+        if self.binary:
+            values = np.frombuffer(self.data, dtype=self.byte_order + self.DTYPES[kind], count=count,
+                                   offset=self.position)
+            self.position += values.nbytes
+        else:
+            values = self.data[self.position:self.position + count]
+            if len(values) < count:
+                raise ValueError(f"Section ends early! Expected:{count} values, Value:{len(values)}")
+            self.position += count
+        return values
+
+    def read_int(self, kind: str = "int") -> int:
+        return int(self.read(kind)[0])
+
+
+def parse_gmsh41_entities(body, binary: bool = False, byte_order: str = "<") -> dict:
+    """
+    Parses the body of a gmsh 4.1 $Entities section. Only the physical tags are kept, bounding boxes and
+    bounding entities are skipped.
+    :return: {(dimension, entity tag): physical tags (k,)}
+    """
+    reader = SectionReader(body, binary, byte_order)
+    counts = [int(value) for value in reader.read("size", 4)]
+    entities = {}
+    for dimension, count in enumerate(counts):
+        for _ in range(count):
+            tag = reader.read_int()
+            reader.read("double", 3 if dimension == 0 else 6)  # point coordinates or bounding box
+            physicals = reader.read("int", reader.read_int("size"))
+            if dimension > 0:
+                reader.read("int", reader.read_int("size"))  # bounding entities
+            entities[(dimension, tag)] = physicals.astype(INDEX_DTYPE)
+    return entities
+
+
+def parse_gmsh41_nodes(body, binary: bool = False, byte_order: str = "<") -> tuple:
+    """
+    Parses the body of a gmsh 4.1 $Nodes section. The entity blocks are concatenated, parametric coordinates
+    are dropped.
+    :return: node_count, ids (N,), coords (N, 3)
+    """
+    reader = SectionReader(body, binary, byte_order)
+    block_count, count, _, _ = (int(value) for value in reader.read("size", 4))
+    ids, coords = [], []
+    for _ in range(block_count):
+        dimension, _, parametric = (int(value) for value in reader.read("int", 3))
+        block_size = reader.read_int("size")
+        ids.append(reader.read("size", block_size))
+        columns = 3 + (dimension if parametric else 0)
+        coords.append(reader.read("double", block_size * columns).reshape(block_size, columns)[:, :3])
+    if not ids:
+        return count, np.empty(0, dtype=INDEX_DTYPE), np.empty((0, 3), dtype=COORD_DTYPE)
+    return count, np.concatenate(ids).astype(INDEX_DTYPE), np.concatenate(coords).astype(COORD_DTYPE)
+
+
+def parse_gmsh41_elements(body, entities: dict, binary: bool = False, byte_order: str = "<") -> tuple:
+    """
+    Parses the body of a gmsh 4.1 $Elements section into the structure of gmsh 2.2. The entity blocks of each
+    element type are concatenated into one ElementBlock with the tags physical, elementary per element,
+    the first physical tag of the entity (0 without physical group) and the entity tag. The further physical
+    tags stay in entities, Gmsh.physical_blocks writes the elements once per physical tag for 2.2.
+    :param entities: physical tags per entity, see parse_gmsh41_entities
+    :return: element_count, list of ElementBlock in order of first appearance of the type
+    """
+    reader = SectionReader(body, binary, byte_order, np.int64)
+    block_count, count, _, _ = (int(value) for value in reader.read("size", 4))
+    grouped = {}
+    for _ in range(block_count):
+        dimension, tag, type = (int(value) for value in reader.read("int", 3))
+        block_size = reader.read_int("size")
+        columns = 1 + GMSH_NODES_PER_TYPE[type]
+        rows = reader.read("size", block_size * columns).reshape(block_size, columns)
+        physicals = entities.get((dimension, tag), ())
+        tags = np.empty((block_size, 2), dtype=INDEX_DTYPE)
+        tags[:, 0] = physicals[0] if len(physicals) else 0
+        tags[:, 1] = tag
+        grouped.setdefault(type, []).append((rows[:, 0], rows[:, 1:], tags))
+    blocks = []
+    for type, parts in grouped.items():
+        ids, nodes, tags = (np.concatenate(columns) for columns in zip(*parts))
+        blocks.append(ElementBlock(type, ids, nodes, tags))
+    return count, blocks
+
+
+def write_binary_table(fh, columns: list, dtypes: list, stats: dict = None, chunk_rows: int = WRITE_CHUNK_ROWS):
+    """
+    Writes the rows of the column arrays as packed binary records. Counterpart of write_table.
+    :param fh: binary file handle
+    :param columns: arrays (1D or 2D) with the same number of rows, written side by side
+    :param dtypes: dtype of each column in the file, e.g. "<i4", "<f8"
+    :param stats: optional dictionary, rows, bytes, seconds and peak_buffer_bytes are accumulated into it
+    :param chunk_rows: number of rows per buffer
+    """
+    start_time = time.perf_counter()
+    columns = [np.asarray(column).reshape(len(column), -1) for column in columns]
+    fields = [(column, dtype) for column, dtype in zip(columns, dtypes) if column.shape[1]]
+    record = np.dtype([(f"f{i}", dtype, (column.shape[1],)) for i, (column, dtype) in enumerate(fields)])
+    rows = len(columns[0])
+    written, peak = 0, 0
+    for start in range(0, rows, chunk_rows):
+        chunk = np.empty(min(chunk_rows, rows - start), dtype=record)
+        for i, (column, dtype) in enumerate(fields):
+            chunk[f"f{i}"] = column[start:start + chunk_rows]
+        fh.write(chunk.tobytes())
+        written += chunk.nbytes
+        peak = max(peak, chunk.nbytes)
+    if stats is not None:
+        stats["rows"] = stats.get("rows", 0) + rows
+        stats["bytes"] = stats.get("bytes", 0) + written
+        stats["seconds"] = stats.get("seconds", 0.0) + time.perf_counter() - start_time
+        stats["peak_buffer_bytes"] = max(stats.get("peak_buffer_bytes", 0), peak)
+
+
+def _table(rows: list, dtype, columns: int = 0) -> np.ndarray:
+    if not rows:
+        return np.empty((0, columns), dtype=dtype)
+    if len({len(row) for row in rows}) > 1:
+        raise ValueError("Rows of differing lengths can not be stored in one array")
+    return np.array(rows, dtype=dtype).reshape(len(rows), -1)
+
+
+# Array Storage --------------------------------------------------------------
+class ElementBlock:
+    """
+    Array storage for all elements of one type. Type ID follows gmsh convention:
+        2 : 3-node triangle, 4 : 4-node tetrahedron
+    :param type: gmsh element type
+    :param ids: element ids, shape (n,). None for consecutive ids id_offset + 1 ... id_offset + n,
+                which are computed on access instead of being stored
+    :param nodes: node ids per element, shape (n, nodes per element)
+    :param tags: tags per element, shape (n, tag count), int32. Floating point tags of tetgen elements (region
+                 attributes) stay float64.
+    :param mesh_type: "gmsh" or "tetgen", mesh format the elements originate from
+    :param id_offset: offset of the consecutive ids, only used if ids is None
+    """
+    def __init__(self, type: int, ids: np.ndarray, nodes: np.ndarray, tags: np.ndarray, mesh_type: str = "gmsh",
+                 id_offset: int = 0):
+        self.type = type
+        self._ids = None if ids is None else np.asarray(ids, dtype=INDEX_DTYPE)
+        self.nodes = np.asarray(nodes, dtype=INDEX_DTYPE)
+        floating = mesh_type == "tetgen" and np.issubdtype(np.asarray(tags).dtype, np.floating)
+        self.tags = np.asarray(tags, dtype=COORD_DTYPE if floating else INDEX_DTYPE)
+        self.mesh_type = mesh_type
+        self.id_offset = id_offset
+
+    @property
+    def ids(self) -> np.ndarray:
+        if self._ids is None:
+            return np.arange(self.id_offset + 1, self.id_offset + len(self) + 1, dtype=INDEX_DTYPE)
+        return self._ids
+
+    def id(self, index: int) -> int:
+        if self._ids is None:
+            return self.id_offset + index + 1
+        return int(self._ids[index])
+
+    def renumbered(self, id_offset: int = 0):
+        """
+        Returns a block with consecutive ids starting at id_offset + 1, sharing nodes and tags with this block
+        """
+        return ElementBlock(self.type, None, self.nodes, self.tags, self.mesh_type, id_offset)
+
+    @classmethod
+    def empty(cls, type: int, mesh_type: str = "gmsh"):
+        return cls(type, np.empty(0), np.empty((0, GMSH_NODES_PER_TYPE.get(type, 0))), np.empty((0, 0)), mesh_type)
+
+    @classmethod
+    def from_records(cls, type: int, elements: list):
+        """
+        :param type: gmsh element type of all elements
+        :param elements: list of element dictionaries (see create_element)
+        """
+        if not elements:
+            return cls.empty(type)
+        ids = [element["id"] for element in elements]
+        nodes = _table([element["nodes"] for element in elements], INDEX_DTYPE)
+        # tetgen tags are kept as strings by create_element, parse as float to allow region attributes
+        tags = _table([element["tags"] for element in elements], COORD_DTYPE)
+        return cls(type, ids, nodes, tags, elements[0]["mesh_type"])
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+class Record(Mapping):
+    """
+    Read-only dictionary view of a single node or element of an array backed mesh.
+    Values are looked up in the arrays on access.
+    """
+    __slots__ = ("_fields", "_index")
+
+    def __init__(self, fields: dict, index: int):
+        self._fields = fields
+        self._index = index
+
+    def __getitem__(self, key):
+        return self._fields[key](self._index)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class RecordView(Sequence):
+    """
+    Read-only list of Records, replaces the former lists of node and element dictionaries.
+    :param length: number of records
+    :param fields: {key: function(index) -> value}
+    """
+    def __init__(self, length: int, fields: dict):
+        self._length = length
+        self._fields = fields
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Record(self._fields, i) for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("record index out of range")
+        return Record(self._fields, index)
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield Record(self._fields, index)
+
+
+def node_view(ids: np.ndarray, coords: np.ndarray, attributes: np.ndarray) -> RecordView:
+    return RecordView(len(ids), {
+        "id": lambda i: int(ids[i]),
+        "coords": lambda i: coords[i].tolist(),
+        "tags": lambda i: attributes[i].tolist(),
+    })
+
+
+def element_view(blocks: list) -> RecordView:
+    """
+    Joins several ElementBlocks into a single view without copying them.
+    """
+    starts = [0]
+    for block in blocks:
+        starts.append(starts[-1] + len(block))
+
+    def field(getter):
+        def get(index):
+            position = bisect.bisect_right(starts, index) - 1
+            return getter(blocks[position], index - starts[position])
+        return get
+
+    return RecordView(starts[-1], {
+        "mesh_type": field(lambda block, i: block.mesh_type),
+        "id": field(lambda block, i: block.id(i)),
+        "type": field(lambda block, i: block.type),
+        "tag_count": field(lambda block, i: block.tags.shape[1]),
+        "tags": field(lambda block, i: block.tags[i].tolist()),
+        "node_count": field(lambda block, i: block.nodes.shape[1]),
+        "nodes": field(lambda block, i: block.nodes[i].tolist()),
+    })
+
+
+# Contacts -------------------------------------------------------------------
+# Faces of a tetrahedron (n0, n1, n2, n3), face i lies opposite of node i
+TETRAHEDRON_FACES = np.array([[1, 2, 3], [0, 3, 2], [0, 1, 3], [0, 2, 1]])
+
+
+def tetrahedron_neighbours(tetrahedra: np.ndarray) -> np.ndarray:
+    """
+    Finds the neighbour across each face of the tetrahedra. Faces are identified by their sorted node triples,
+    after one lexicographic sort faces shared by two tetrahedra are adjacent rows. O(n log n).
+    :param tetrahedra: node ids or indices, shape (n, 4)
+    :return: index of the tetrahedron opposite of node i, shape (n, 4), -1 on the boundary
+    """
+    keys = np.sort(tetrahedra[:, TETRAHEDRON_FACES].reshape(-1, 3), axis=1)
+    order = np.lexsort(keys.T[::-1])
+    shared = np.flatnonzero(np.all(keys[order[1:]] == keys[order[:-1]], axis=1))
+    first, second = order[shared], order[shared + 1]
+    neighbours = np.full(len(keys), -1, dtype=INDEX_DTYPE)
+    neighbours[first] = second // 4
+    neighbours[second] = first // 4
+    return neighbours.reshape(-1, 4)
+
+
+def boundary_faces(tetrahedra: np.ndarray, neighbours: np.ndarray = None) -> tuple:
+    """
+    Extracts the boundary triangles of a tetrahedral mesh, the faces without neighbour
+    :param tetrahedra: node ids or indices, shape (n, 4)
+    :param neighbours: result of tetrahedron_neighbours, computed if None
+    :return: faces (m, 3), tetrahedron index (m,) and node opposite of the face (m,)
+    """
+    if neighbours is None:
+        neighbours = tetrahedron_neighbours(tetrahedra)
+    tetrahedron, corner = np.nonzero(neighbours < 0)
+    faces = tetrahedra[tetrahedron[:, None], TETRAHEDRON_FACES[corner]]
+    return faces, tetrahedron, tetrahedra[tetrahedron, corner]
+
+
+def group_planes(points: np.ndarray, normals: np.ndarray, tolerance: float = 1e-6) -> np.ndarray:
+    """
+    Groups triangles into planes by their unit normal and distance to the origin
+    :param points: triangle vertex coordinates, shape (m, 3, 3)
+    :param normals: unit normals, shape (m, 3)
+    :param tolerance: relative tolerance of normal and distance
+    :return: plane label per triangle (m,), labels start at 0
+    """
+    scale = max(float(np.ptp(points)), np.finfo(COORD_DTYPE).tiny) if len(points) else 1.0
+    distance = np.einsum("ij,ij->i", normals, points[:, 0]) / scale
+    keys = np.round(np.column_stack([normals, distance]) / tolerance).astype(np.int64)
+    _, labels = np.unique(keys, axis=0, return_inverse=True)
+    return labels.ravel()
+
+
+def select_box(xmin: float, ymin: float, zmin: float, xmax: float, ymax: float, zmax: float):
+    """
+    Contact selector for MeshType.define_physical_groups, selects triangles completely inside of the box
+    """
+    low, high = np.array([xmin, ymin, zmin]), np.array([xmax, ymax, zmax])
+    return lambda points, normals: np.all((points >= low) & (points <= high), axis=(1, 2))
+
+
+def select_plane(normal, offset: float, tolerance: float = 1e-6):
+    """
+    Contact selector for MeshType.define_physical_groups, selects triangles on the plane normal * x = offset
+    with the outward normal pointing in direction of normal
+    """
+    normal = np.asarray(normal, dtype=COORD_DTYPE) / np.linalg.norm(normal)
+    return lambda points, normals: ((np.abs(points @ normal - offset).max(axis=1) <= tolerance)
+                                    & (normals @ normal > 1 - tolerance))
+
+
+# Topology -------------------------------------------------------------------
+# Edges of a tetrahedron (n0, n1, n2, n3)
+TETRAHEDRON_EDGES = np.array([[0, 1], [0, 2], [0, 3], [1, 2], [1, 3], [2, 3]])
+
+
+class Csr:
+    """
+    Compressed sparse rows, the entries of row i are indices[offsets[i]:offsets[i + 1]]
+    """
+    __slots__ = ("offsets", "indices")
+
+    def __init__(self, offsets: np.ndarray, indices: np.ndarray):
+        self.offsets = offsets
+        self.indices = indices
+
+    @classmethod
+    def from_pairs(cls, rows: np.ndarray, columns: np.ndarray, row_count: int):
+        """
+        :param rows: row of each entry
+        :param columns: value of each entry, entries of a row are sorted ascending
+        :param row_count: number of rows
+        """
+        order = np.lexsort((columns, rows))
+        offsets = np.zeros(row_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=row_count), out=offsets[1:])
+        return cls(offsets, np.asarray(columns)[order].astype(INDEX_DTYPE))
+
+    def __getitem__(self, row: int) -> np.ndarray:
+        return self.indices[self.offsets[row]:self.offsets[row + 1]]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+class MeshTopology:
+    """
+    Adjacency index of the tetrahedra, every relation is built on first access and kept afterwards.
+    Nodes and tetrahedra are 0-based row indices into node_ids / tetrahedron_block:
+        node_tetrahedra[node] -> tetrahedra using the node
+        tetrahedron_neighbours[tetrahedron] -> tetrahedra sharing a face
+        face_tetrahedra[face] -> the one or two tetrahedra of a face, faces[face] -> its node indices
+        node_neighbours[node] -> nodes sharing an edge
+    :param tetrahedra: node indices, shape (n, 4)
+    :param node_count: number of nodes
+    :param neighbours: known neighbours, e.g. from a TetGen .neigh file, shape (n, 4), -1 on the boundary
+    :param edges: known edges (e, 2), e.g. from a TetGen .edge file. Only used together with neighbours and if
+                  they are all edges of the mesh by the Euler characteristic of a solid without cavities
+    :param source: array the index was built from, MeshType.topology rebuilds the index if it was replaced
+    """
+    def __init__(self, tetrahedra: np.ndarray, node_count: int, neighbours: np.ndarray = None,
+                 edges: np.ndarray = None, source: np.ndarray = None):
+        self.tetrahedra = tetrahedra
+        self.node_count = node_count
+        self.source = source
+        if neighbours is not None:
+            self.neighbours = neighbours
+            face_count = (4 * len(tetrahedra) + np.count_nonzero(neighbours < 0)) // 2
+            if edges is not None and len(edges) == node_count + face_count - len(tetrahedra) - 1:
+                self.edges = edges
+
+    @cached_property
+    def neighbours(self) -> np.ndarray:
+        """
+        Index of the tetrahedron opposite of node i, shape (n, 4), -1 on the boundary
+        """
+        return tetrahedron_neighbours(self.tetrahedra)
+
+    @cached_property
+    def tetrahedron_neighbours(self) -> Csr:
+        tetrahedron, corner = np.nonzero(self.neighbours >= 0)
+        return Csr.from_pairs(tetrahedron, self.neighbours[tetrahedron, corner], len(self.tetrahedra))
+
+    @cached_property
+    def node_tetrahedra(self) -> Csr:
+        return Csr.from_pairs(self.tetrahedra.ravel(), np.repeat(np.arange(len(self.tetrahedra)), 4),
+                              self.node_count)
+
+    @cached_property
+    def tetrahedron_faces(self) -> np.ndarray:
+        """
+        Face index of each face of each tetrahedron, shape (n, 4). A face belongs to the tetrahedron
+        with the lower index, faces are numbered in order of their tetrahedron.
+        """
+        neighbours = self.neighbours
+        tetrahedron = np.arange(len(neighbours))[:, None]
+        owner = (neighbours < 0) | (tetrahedron < neighbours)
+        face_ids = np.full(neighbours.shape, -1, dtype=np.int64)
+        face_ids[owner] = np.arange(np.count_nonzero(owner))
+        tetrahedron, corner = np.nonzero(~owner)
+        neighbour = neighbours[tetrahedron, corner]
+        neighbour_corner = np.argmax(neighbours[neighbour] == tetrahedron[:, None], axis=1)
+        face_ids[tetrahedron, corner] = face_ids[neighbour, neighbour_corner]
+        return face_ids
+
+    @cached_property
+    def faces(self) -> np.ndarray:
+        """
+        Node indices of each face, shape (f, 3), oriented outwards of the owning tetrahedron
+        """
+        owner = (self.neighbours < 0) | (np.arange(len(self.neighbours))[:, None] < self.neighbours)
+        tetrahedron, corner = np.nonzero(owner)
+        return self.tetrahedra[tetrahedron[:, None], TETRAHEDRON_FACES[corner]]
+
+    @cached_property
+    def face_tetrahedra(self) -> Csr:
+        return Csr.from_pairs(self.tetrahedron_faces.ravel(), np.repeat(np.arange(len(self.tetrahedra)), 4),
+                              len(self.faces))
+
+    @cached_property
+    def edges(self) -> np.ndarray:
+        """
+        Node indices of each edge, shape (e, 2), sorted
+        """
+        pairs = np.sort(self.tetrahedra[:, TETRAHEDRON_EDGES].reshape(-1, 2), axis=1).astype(np.int64)
+        keys = np.unique(pairs[:, 0] * self.node_count + pairs[:, 1])
+        return np.column_stack([keys // self.node_count, keys % self.node_count]).astype(INDEX_DTYPE)
+
+    @cached_property
+    def node_neighbours(self) -> Csr:
+        first, second = self.edges[:, 0], self.edges[:, 1]
+        return Csr.from_pairs(np.concatenate([first, second]), np.concatenate([second, first]), self.node_count)
+
+    def find_face(self, nodes) -> int:
+        """
+        Looks up a face through the tetrahedra of its first node, O(k)
+        :param nodes: three node indices
+        :return: face index, -1 if the nodes do not form a face of the mesh
+        """
+        key = np.sort(nodes)
+        candidates = self.node_tetrahedra[key[0]]
+        faces = np.sort(self.tetrahedra[candidates][:, TETRAHEDRON_FACES], axis=2)
+        tetrahedron, corner = np.nonzero(np.all(faces == key, axis=2))
+        if not len(tetrahedron):
+            return -1
+        return int(self.tetrahedron_faces[candidates[tetrahedron[0]], corner[0]])
+
+    def boundary_faces(self) -> tuple:
+        """
+        :return: boundary faces (m, 3), tetrahedron index (m,) and node opposite of the face (m,), as node indices
+        """
+        return boundary_faces(self.tetrahedra, self.neighbours)
+
+
+def _breadth_first_levels(adjacency: Csr, start: int, degree: np.ndarray, visited: np.ndarray) -> list:
+    """
+    Cuthill-McKee traversal one level at a time. The nodes of the next level are ordered by the position of
+    their first visited neighbour in the current level, then by degree, as in the node by node algorithm.
+    Marks the traversed nodes in visited.
+    :return: list of node index arrays, one per level
+    """
+    visited[start] = True
+    frontier = np.array([start])
+    levels = [frontier]
+    while True:
+        counts = degree[frontier]
+        starts = np.repeat(adjacency.offsets[frontier] - np.cumsum(counts) + counts, counts)
+        neighbours = adjacency.indices[starts + np.arange(counts.sum())]
+        parents = np.repeat(np.arange(len(frontier)), counts)
+        unvisited = ~visited[neighbours]
+        neighbours, parents = neighbours[unvisited], parents[unvisited]
+        if not len(neighbours):
+            return levels
+        neighbours = neighbours[np.lexsort((neighbours, degree[neighbours], parents))]
+        _, first = np.unique(neighbours, return_index=True)
+        frontier = neighbours[np.sort(first)]
+        visited[frontier] = True
+        levels.append(frontier)
+
+
+def reverse_cuthill_mckee(adjacency: Csr) -> np.ndarray:
+    """
+    Bandwidth reducing node order. Each connected component starts at a pseudo-peripheral node, found from
+    its node of lowest degree by repeated traversals (George-Liu).
+    :param adjacency: node neighbours, e.g. MeshTopology.node_neighbours
+    :return: order, order[i] is the index of the node placed at position i
+    """
+    degree = np.diff(adjacency.offsets)
+    visited = np.zeros(len(adjacency), dtype=bool)
+    components = []
+    for start in np.argsort(degree, kind="stable"):
+        if visited[start]:
+            continue
+        levels = _breadth_first_levels(adjacency, start, degree, visited.copy())
+        while True:
+            last = levels[-1]
+            candidate = last[np.argmin(degree[last])]
+            candidate_levels = _breadth_first_levels(adjacency, candidate, degree, visited.copy())
+            if len(candidate_levels) <= len(levels):
+                break
+            start, levels = candidate, candidate_levels
+        components.append(np.concatenate(_breadth_first_levels(adjacency, start, degree, visited)))
+    if not components:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(components)[::-1]
+
+
+def bandwidth(edges: np.ndarray, position: np.ndarray = None) -> dict:
+    """
+    Bandwidth and profile of the symmetric matrix with the sparsity of the node graph
+    :param edges: node index pairs, shape (e, 2)
+    :param position: new position of each node, the current order if None
+    :return: dict bandwidth (largest index distance of an edge), profile (sum over the rows of the distance from
+             the first entry left of the diagonal)
+    """
+    if position is not None:
+        edges = position[edges]
+    low, high = edges.min(axis=1), edges.max(axis=1)
+    if not len(edges):
+        return {"bandwidth": 0, "profile": 0}
+    first = np.arange(int(high.max()) + 1)
+    np.minimum.at(first, high, low)
+    return {"bandwidth": int((high - low).max()), "profile": int((np.arange(len(first)) - first).sum())}
+
+
 class MeshType:
+    """
+    Array backed mesh. Nodes are stored as node_ids (N,), node_coords (N, 3) and node_attributes (N, k),
+    elements as ElementBlocks of int32 connectivity and tags. nodes, elements, triangles and tetrahedra
+    are read-only views returning dictionaries as created by create_node / create_element.
+    Creating a mesh from another mesh shares the arrays, nothing is copied.
+    """
     def __init__(self, mesh=None):
         if mesh is None:
-            self.nodes = []
-            self.node_count = 0
-            self.physical_names = []
-            self.elements = []
-            self.element_count = 0
-            self.triangles = []
-            self.tetrahedra = []
+            self.reset_data()
         else:
-            self.nodes = mesh.nodes
-            self.node_count = mesh.node_count
-            self.physical_names = mesh.physical_names
-            self.elements = mesh.elements
-            self.element_count = mesh.element_count
-            self.triangles = mesh.triangles
-            self.tetrahedra = mesh.tetrahedra
-
-    def read_files(self, file_name):
+            self.read_mesh(mesh)
+
+    def reset_data(self):
+        self.node_ids = np.empty(0, dtype=INDEX_DTYPE)
+        self.node_coords = np.empty((0, 3), dtype=COORD_DTYPE)
+        self.node_attributes = np.empty((0, 0), dtype=COORD_DTYPE)
+        self.node_count = 0
+        self.physical_names = []
+        self.element_blocks = []
+        self.element_count = 0
+        self.triangle_block = ElementBlock.empty(2)
+        self.tetrahedron_block = ElementBlock.empty(4)
+        self._topology = None
+
+    @property
+    def topology(self) -> MeshTopology:
+        """
+        Adjacency index of the tetrahedra, built on first access and rebuilt if the tetrahedra were replaced
+        """
+        if self._topology is None or self._topology.source is not self.tetrahedron_block.nodes:
+            self._topology = MeshTopology(self.node_index(self.tetrahedron_block.nodes), len(self.node_ids),
+                                          source=self.tetrahedron_block.nodes)
+        return self._topology
+
+    @property
+    def nodes(self) -> RecordView:
+        return node_view(self.node_ids, self.node_coords, self.node_attributes)
+
+    @property
+    def elements(self) -> RecordView:
+        return element_view(self.element_blocks)
+
+    @property
+    def triangles(self) -> RecordView:
+        return element_view([self.triangle_block])
+
+    @property
+    def tetrahedra(self) -> RecordView:
+        return element_view([self.tetrahedron_block])
+
+    def read_files(self, file_name, processes: int = 1):
         pass
 
+    def source_files(self, file_name) -> list:
+        """
+        :return: paths of all files read by read_files(file_name)
+        """
+        return [file_name]
+
+    def read_cached(self, file_name, cache=None, processes: int = 1):
+        """
+        read_files through a MeshCache. The mesh is parsed once per content of the source files,
+        afterwards the arrays are memory mapped from the cache.
+        :param file_name: as for read_files
+        :param cache: MeshCache, default cache directory if None
+        :param processes: as for read_files
+        """
+        cache = MeshCache() if cache is None else cache
+        key = cache.key(type(self).__name__, self.source_files(file_name))
+        if not cache.load(key, self):
+            self.read_files(file_name, processes)
+            cache.store(key, self)
+
     def write_files(self, file_name):
         pass
 
+    @staticmethod
+    def element_entities(block: ElementBlock) -> tuple:
+        """
+        Entity tags of gmsh 4.1 and gmsh models are positive, elements without a positive elementary tag
+        (e.g. converted from tetgen) are placed on entity 1, physical tags below 1 (e.g. tetgen boundary
+        markers) are dropped.
+        :return: physical tag (0 if there is none) and entity tag per element of block
+        """
+        tag_count = block.tags.shape[1]
+        physical = block.tags[:, 0] if tag_count > 0 else np.zeros(len(block), dtype=INDEX_DTYPE)
+        entity = block.tags[:, 1] if tag_count > 1 else np.ones(len(block), dtype=INDEX_DTYPE)
+        return np.where(physical > 0, physical, 0), np.where(entity > 0, entity, 1)
+
+    def to_gmsh_model(self, name: str = "mesh") -> dict:
+        """
+        Pushes the mesh into a new model of the running gmsh session with the bulk addNodes /
+        addElementsByType calls, no .msh file is written. gmsh.initialize() has to be called before.
+        Elements read from gmsh files keep their elementary entity and physical group (tags 1 and 0), mapped
+        like element_entities, all other elements go into discrete entity 1 of their dimension. Physical
+        groups get the name of the matching physical_names entry.
+        :param name: name of the gmsh model
+        :return: {dimension: [entity tags]}
+        """
+        import gmsh
+
+        gmsh.model.add(name)
+        entities, physical_groups, element_groups = {}, {}, []
+        for block in self.element_blocks:
+            dim = GMSH_DIMENSION_PER_TYPE[block.type]
+            if block.mesh_type == "gmsh" and block.tags.shape[1] >= 2:
+                physical_tags, entity_tags = self.element_entities(block)
+            else:
+                entity_tags, physical_tags = np.ones(len(block), dtype=INDEX_DTYPE), None
+            for entity in np.unique(entity_tags).tolist():
+                if entity not in entities.setdefault(dim, []):
+                    gmsh.model.addDiscreteEntity(dim, entity)
+                    entities[dim].append(entity)
+                selected = entity_tags == entity
+                element_groups.append((entity, block, selected))
+                if physical_tags is not None:
+                    for physical in np.unique(physical_tags[selected]).tolist():
+                        if physical == 0:  # no physical group
+                            continue
+                        physical_groups.setdefault((dim, physical), set()).add(entity)
+
+        # nodes have to exist before the elements, they are attached to the first entity of the highest
+        # dimension and moved to the entities they belong to by reclassifyNodes
+        dim = max(entities)
+        gmsh.model.mesh.addNodes(dim, entities[dim][0], self.node_ids, self.node_coords.ravel())
+        for entity, block, selected in element_groups:
+            gmsh.model.mesh.addElementsByType(entity, block.type, block.ids[selected], block.nodes[selected].ravel())
+        gmsh.model.mesh.reclassifyNodes()
+
+        names = {(name["dim"], name["id"]): name["name"].strip('"') for name in self.physical_names}
+        for (dim, physical), entity_tags in physical_groups.items():
+            gmsh.model.addPhysicalGroup(dim, sorted(entity_tags), physical, names.get((dim, physical), ""))
+        return entities
+
+    def node_index(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Maps node ids onto row indices of node_ids / node_coords
+        """
+        lookup = np.full(int(self.node_ids.max()) + 1, -1, dtype=np.int64)
+        lookup[self.node_ids] = np.arange(len(self.node_ids))
+        return lookup[ids]
+
+    def reorder_nodes(self) -> dict:
+        """
+        Renumbers the nodes 1 ... n in reverse Cuthill-McKee order of the edge graph of the tetrahedra, which
+        reduces the bandwidth of the system matrix. Coordinates, attributes and the nodes of all element blocks
+        are permuted consistently, the order and ids of the elements are kept.
+        :return: dict before, after with bandwidth and profile of the node graph
+        """
+        topology = self.topology
+        order = reverse_cuthill_mckee(topology.node_neighbours)
+        # nodes outside of any tetrahedron keep their relative order at the end
+        unused = np.setdiff1d(np.arange(len(self.node_ids)), order)
+        order = np.concatenate([order, unused])
+        position = np.empty(len(order), dtype=np.int64)
+        position[order] = np.arange(len(order))
+        report = {"before": bandwidth(topology.edges), "after": bandwidth(topology.edges, position)}
+
+        new_ids = (position + 1).astype(INDEX_DTYPE)
+        remapped = {}  # blocks share node arrays, each is mapped once and stays shared
+
+        def remap(block: ElementBlock) -> ElementBlock:
+            if id(block.nodes) not in remapped:
+                remapped[id(block.nodes)] = new_ids[self.node_index(block.nodes)]
+            return ElementBlock(block.type, block._ids, remapped[id(block.nodes)], block.tags, block.mesh_type,
+                                block.id_offset)
+
+        self.triangle_block = remap(self.triangle_block)
+        self.tetrahedron_block = remap(self.tetrahedron_block)
+        self.element_blocks = [remap(block) for block in self.element_blocks]
+        self.node_ids = np.arange(1, len(order) + 1, dtype=INDEX_DTYPE)
+        self.node_coords = self.node_coords[order]
+        self.node_attributes = self.node_attributes[order]
+        self._topology = None
+        return report
+
+    def define_physical_groups(self, volume_name: str, contacts: dict, whole_planes: bool = True,
+                               plane_tolerance: float = 1e-6):
+        """
+        Defines gmsh physical groups without a gmsh session. All tetrahedra form the volume group, the triangles
+        are replaced by the boundary triangles selected for each contact. Boundary triangles get the elementary
+        tag of their plane (like classifySurfaces(0)), the mesh can be written by Gmsh.write_files afterwards.
+        :param volume_name: physical name of the tetrahedra, e.g. "Bulk", physical id 1
+        :param contacts: {name: selector} physical ids 2, 3, ... in order. A selector is a function
+                         (points (m, 3, 3), outward unit normals (m, 3)) -> bool mask (m,), see select_box and
+                         select_plane, or a box tuple (xmin, ymin, zmin, xmax, ymax, zmax)
+        :param whole_planes: select planes of which all triangles match, like getEntitiesInBoundingBox selects
+                             whole surfaces. If False single triangles are selected
+        :param plane_tolerance: relative tolerance for grouping boundary triangles into planes
+        """
+        tetrahedra = self.tetrahedron_block.nodes
+        faces, _, opposite = self.topology.boundary_faces()
+        points = self.node_coords[faces]
+        normals = np.cross(points[:, 1] - points[:, 0], points[:, 2] - points[:, 0])
+        # orient outwards, away from the node opposite of the face
+        inwards = np.einsum("ij,ij->i", normals, self.node_coords[opposite] - points[:, 0]) > 0
+        faces[inwards] = faces[inwards][:, ::-1]
+        normals[inwards] *= -1
+        normals /= np.linalg.norm(normals, axis=1)[:, None]
+        planes = group_planes(points, normals, plane_tolerance)
+
+        selected_faces, selected_tags = [], []
+        self.physical_names = []
+        for physical, (name, selector) in enumerate(contacts.items(), start=2):
+            if not callable(selector):
+                selector = select_box(*selector)
+            mask = selector(points, normals)
+            if whole_planes:
+                mask = (np.bincount(planes, weights=~mask, minlength=planes.max() + 1) == 0)[planes]
+            selected_faces.append(self.node_ids[faces[mask]])
+            selected_tags.append(np.column_stack([np.full(mask.sum(), physical), planes[mask] + 1]))
+            self.physical_names.append({"dim": 2, "id": physical, "name": f'"{name}"'})
+        self.physical_names.append({"dim": 3, "id": 1, "name": f'"{volume_name}"'})
+
+        triangles = ElementBlock(2, None, np.concatenate(selected_faces).reshape(-1, 3),
+                                 np.concatenate(selected_tags).reshape(-1, 2), "gmsh")
+        tetrahedron_tags = np.broadcast_to(np.array([1, 1], dtype=INDEX_DTYPE), (len(tetrahedra), 2))
+        tetrahedra = ElementBlock(4, None, tetrahedra, tetrahedron_tags, "gmsh")
+        self.triangle_block = triangles
+        self.tetrahedron_block = tetrahedra
+        self.element_blocks = [triangles, tetrahedra.renumbered(len(triangles))]
+        self.element_count = len(triangles) + len(tetrahedra)
+
+    def to_devsim_arrays(self) -> tuple:
+        """
+        Converts the mesh into the in-memory form of devsim create_gmsh_mesh. All elements need a named
+        physical group (gmsh tag 0).
+        :return: coordinates [x0, y0, z0, x1, ...], physical_names [name0, ...],
+                 elements [devsim type, physical name index, node index 0, node index 1, ..., devsim type, ...]
+        """
+        physical_names = [name["name"].strip('"') for name in self.physical_names]
+        name_index = {(name["dim"], name["id"]): i for i, name in enumerate(self.physical_names)}
+
+        elements = []
+        for block in self.element_blocks:
+            dim = GMSH_DIMENSION_PER_TYPE[block.type]
+            if block.mesh_type != "gmsh" or block.tags.shape[1] == 0:
+                raise ValueError(f"Elements of type {block.type} have no physical group")
+            physical_tags, inverse = np.unique(block.tags[:, 0], return_inverse=True)
+            missing = [int(tag) for tag in physical_tags if (dim, int(tag)) not in name_index]
+            if missing:
+                raise ValueError(f"Physical groups {missing} of dimension {dim} have no physical name")
+            physical_index = np.array([name_index[(dim, int(tag))] for tag in physical_tags])[inverse.ravel()]
+            elements.append(np.column_stack([np.full(len(block), DEVSIM_TYPE_PER_GMSH_TYPE[block.type]),
+                                             physical_index, self.node_index(block.nodes)]).ravel())
+        return self.node_coords.ravel().tolist(), physical_names, np.concatenate(elements).tolist()
+
     def read_mesh(self, mesh):
-        pass
+        self.node_ids = mesh.node_ids
+        self.node_coords = mesh.node_coords
+        self.node_attributes = mesh.node_attributes
+        self.node_count = mesh.node_count
+        self.physical_names = mesh.physical_names
+        self.element_blocks = mesh.element_blocks
+        self.element_count = mesh.element_count
+        self.triangle_block = mesh.triangle_block
+        self.tetrahedron_block = mesh.tetrahedron_block
+        self._topology = mesh._topology
 
 
 class Gmsh(MeshType):
+    """
+    Reads gmsh 2.2 and 4.1, ASCII and binary. Both versions end up in the same arrays, the tags of the elements
+    are physical, elementary as in 2.2. Writing either version from them is a matter of formatting the arrays,
+    so converting 4.1 to 2.2 for devsim is write_files(file_name, version="2.2") after read_files.
+    """
     def __init__(self, mesh=None):
+        self.version = "2.2"
+        self.entities = {}
         super().__init__(mesh)
 
-    def reset_data(self):
-        self.nodes = []
-        self.node_count = 0
-        self.physical_names = []
-        self.elements = []
-        self.element_count = 0
-        self.triangles = []
-        self.tetrahedra = []
+    def read_mesh(self, mesh):
+        super().read_mesh(mesh)
+        # region attributes of TetGen become integer tags, blocks sharing tags keep sharing them
+        converted = {}
+
+        def convert(block):
+            if np.issubdtype(block.tags.dtype, np.integer):
+                return block
+            if id(block.tags) not in converted:
+                converted[id(block.tags)] = integer_tags(block.tags, f"{block.mesh_type} elements of type {block.type}")
+            return ElementBlock(block.type, block._ids, block.nodes, converted[id(block.tags)], block.mesh_type,
+                                block.id_offset)
+
+        self.element_blocks = [convert(block) for block in self.element_blocks]
+        self.triangle_block, self.tetrahedron_block = convert(self.triangle_block), convert(self.tetrahedron_block)
 
-    def read_files(self, file_name):
+    def source_files(self, file_name) -> list:
         if not file_name[-4:] == ".msh":
             file_name += ".msh"
-        with open(file_name) as fh:
-            current_mode = None
-            self.reset_data()
-            for line in fh:
-                if current_mode != self.mode_selector(line, current_mode):  # mode has changed
-                    current_mode = self.mode_selector(line, current_mode)
-                else:
-                    self.line_handler(line, current_mode)
+        return [file_name]
+
+    def read_files(self, file_name, processes: int = 1):
+        """
+        :param file_name: path of the .msh file
+        :param processes: worker processes to parse the ASCII Nodes and Elements of gmsh 2.2 in parts, 1 parses
+                          serially. Binary sections are used in place and 4.1 is always parsed serially.
+        """
+        if not file_name[-4:] == ".msh":
+            file_name += ".msh"
+        self.reset_data()
+        self.binary, self.byte_order, self.entities = False, "<", {}
+        if processes > 1:
+            self.read_parallel(file_name, processes)
+        else:
+            with open(file_name, "rb") as fh:
+                data = fh.read()
+            for name, (start, end) in gmsh_sections(data).items():
+                self.section_handler(name, memoryview(data)[start:end])
         self.check_data_and_convert()
 
-    def line_handler(self, line: str, current_mode: str):
-        match current_mode:
-            case "header":
-                if line.strip().split()[0] != "2.2":
-                    raise ValueError(f"Unsupported Gmsh Version: {line.strip().split()[0]}, only Version 2.2")
-            case "names":
-                if len(line.split()) == 1:
-                    return
-                self.physical_names.append(create_physical_name(line))
-            case "nodes":
-                if len(line.split()) == 1:
-                    self.node_count = int(line.strip())
-                    return
-                self.nodes.append(create_node("gmsh", line))
-            case "elements":
-                if len(line.split()) == 1:
-                    self.element_count = int(line.strip())
-                    return
-                self.elements.append(create_element("gmsh", line))
-            case "":
-                return
-
-    def mode_selector(self, line: str, current_mode) -> str:
-        match line:
-            case str(x) if "$MeshFormat" in x:
-                return "header"
-            case str(x) if "$PhysicalNames" in x:
-                return "names"
-            case str(x) if "$Nodes" in x:
-                return "nodes"
-            case str(x) if "$Elements" in x:
-                return "elements"
-            case str(x) if "$End" in x:
-                return ""
-            case _:
-                return current_mode
+    def read_parallel(self, file_name, processes: int):
+        """
+        Parses the memory mapped file, the ASCII Nodes and Elements of gmsh 2.2 in line-aligned parts by a
+        worker pool. The parts are joined in order. All other sections are copied out of the map, which is
+        closed before returning.
+        """
+        with open(file_name, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data, \
+                ExitStack() as stack:
+            pool = None
+            for name, (start, end) in gmsh_sections(data).items():
+                if name not in ("Nodes", "Elements") or self.binary or self.version != "2.2":
+                    self.section_handler(name, data[start:end])
+                    continue
+                if pool is None:
+                    pool = stack.enter_context(parallel_pool(processes))
+                count_end = data.find(b"\n", start, end) + 1
+                count = int(data[start:count_end])
+                if name == "Nodes":
+                    parts = parse_parallel(pool, file_name, data, count_end, end, "float")
+                    values = np.concatenate(parts) if parts else np.empty(0, dtype=COORD_DTYPE)
+                    if values.size != 4 * count:
+                        raise ValueError(f"Node counts do not match! Expected:{count}, Value:{values.size / 4}")
+                    values = values.reshape(count, 4)
+                    self.node_count, self.node_ids = count, values[:, 0].astype(INDEX_DTYPE)
+                    self.node_coords = np.ascontiguousarray(values[:, 1:])
+                    self.node_attributes = np.empty((count, 0), dtype=COORD_DTYPE)
+                else:
+                    parts = parse_parallel(pool, file_name, data, count_end, end, "elements")
+                    self.element_count = count
+                    self.element_blocks = merge_blocks([block for part in parts for block in part])
+
+    def section_handler(self, name: str, body):
+        match name:
+            case "MeshFormat":
+                version, file_type, data_size = bytes(body).split(b"\n", 1)[0].decode().split()
+                if version not in GMSH_VERSIONS:
+                    raise ValueError(f"Unsupported Gmsh Version: {version}, only Version 2.2 and 4.1")
+                self.version = version
+                self.binary = file_type == "1"
+                if self.binary:
+                    if data_size != "8":
+                        raise ValueError(f"Unsupported data size: {data_size}, only 8 byte floats")
+                    one = bytes(body).split(b"\n", 1)[1][:4]
+                    self.byte_order = "<" if np.frombuffer(one, dtype="<i4")[0] == 1 else ">"
+            case "PhysicalNames":
+                self.physical_names = [create_physical_name(line) for line in bytes(body).decode().splitlines()[1:]
+                                       if line.strip()]
+            case "Entities":
+                self.entities = parse_gmsh41_entities(body, self.binary, self.byte_order)
+            case "Nodes" if self.version == "4.1":
+                self.node_count, self.node_ids, self.node_coords = parse_gmsh41_nodes(body, self.binary,
+                                                                                      self.byte_order)
+                self.node_attributes = np.empty((self.node_count, 0), dtype=COORD_DTYPE)
+            case "Elements" if self.version == "4.1":
+                self.element_count, self.element_blocks = parse_gmsh41_elements(body, self.entities, self.binary,
+                                                                                self.byte_order)
+            case "Nodes" if self.binary:
+                self.node_count, self.node_ids, self.node_coords = parse_gmsh_nodes_binary(body, self.byte_order)
+                self.node_attributes = np.empty((self.node_count, 0), dtype=COORD_DTYPE)
+            case "Elements" if self.binary:
+                self.element_count, self.element_blocks = parse_gmsh_elements_binary(body, self.byte_order)
+            case "Nodes":
+                self.node_count, self.node_ids, self.node_coords = parse_gmsh_nodes(body)
+                self.node_attributes = np.empty((self.node_count, 0), dtype=COORD_DTYPE)
+            case "Elements":
+                self.element_count, self.element_blocks = parse_gmsh_elements(body)
 
     def check_data_and_convert(self):
-        if not self.node_count == len(self.nodes):
-            raise ValueError(f"Node counts do not match! Expected:{self.node_count}, Value:{len(self.nodes)}")
-        if not self.element_count == len(self.elements):
-            raise ValueError(f"Element counts do not match! Expected:{self.element_count}, Value:{len(self.elements)}")
-
-        for element in self.elements:
-            if element["type"] == 2:
-                self.triangles.append(element)
-            elif element["type"] == 4:
-                self.tetrahedra.append(element)
-
-        self.triangles = copy.deepcopy(self.triangles)
-        for tri in self.triangles:
-            tri["id"] = tri["id"] % len(self.triangles) + 1
-
-        self.tetrahedra = copy.deepcopy(self.tetrahedra)
-        for tetra in self.tetrahedra:
-            tetra["id"] = tetra["id"] % len(self.tetrahedra) + 1
-        self.triangles.sort(key=lambda x: x["id"])
-        self.tetrahedra.sort(key=lambda x: x["id"])
+        if not self.node_count == len(self.node_ids):
+            raise ValueError(f"Node counts do not match! Expected:{self.node_count}, Value:{len(self.node_ids)}")
+        element_total = sum(len(block) for block in self.element_blocks)
+        if not self.element_count == element_total:
+            raise ValueError(f"Element counts do not match! Expected:{self.element_count}, Value:{element_total}")
 
-    def write_files(self, file_name):
+        self.triangle_block = self.renumber_block(2)
+        self.tetrahedron_block = self.renumber_block(4)
+
+    def renumber_block(self, type: int) -> ElementBlock:
+        """
+        Returns the elements of one type with ids renumbered 1 ... n, arrays are shared with element_blocks
+        """
+        blocks = [block for block in self.element_blocks if block.type == type]
+        if not blocks:
+            return ElementBlock.empty(type)
+        return blocks[0].renumbered()
+
+    def write_files(self, file_name, binary: bool = False, version: str = "2.2"):
+        """
+        :param file_name: path of the .msh file
+        :param binary: write gmsh binary (file-type 1) instead of ASCII
+        :param version: gmsh file format version, "2.2" or "4.1"
+        """
+        self.write_scaled_files([(1.0, file_name)], binary, version)
+
+    def write_scaled_files(self, variants: list, binary: bool = False, version: str = "2.2"):
+        """
+        Writes one .msh file per variant with the coordinates multiplied by its scaling factor, like
+        gmsh Mesh.ScalingFactor. PhysicalNames and Elements are formatted once and each buffer is written to
+        all files, only the Nodes section (and for 4.1 the Entities with their bounding boxes) is formatted
+        per variant.
+        :param variants: list of (scaling factor, file name)
+        :param binary: write gmsh binary (file-type 1) instead of ASCII
+        :param version: gmsh file format version, "2.2" or "4.1"
+        """
+        writers = {
+            ("2.2", False): (self.write_head, self.write_nodes, self.write_elements),
+            ("2.2", True): (self.write_binary_head, self.write_binary_nodes, self.write_binary_elements),
+            ("4.1", False): (self.write_head41, self.write_nodes41, self.write_elements41),
+            ("4.1", True): (self.write_binary_head41, self.write_binary_nodes41, self.write_binary_elements41),
+        }
+        if version not in GMSH_VERSIONS:
+            raise ValueError(f"Unsupported Gmsh Version: {version}, only Version 2.2 and 4.1")
+        variants = [(scale, name if name[-4:] == ".msh" else name + ".msh") for scale, name in variants]
+        self.write_stats = {"Nodes": {}, "Elements": {}}
+        if version == "4.1":
+            self.write_entities = self.entity_nodes()
+        with ExitStack() as stack:
+            handles = [stack.enter_context(open(name, "wb" if binary else "w")) for _, name in variants]
+            all_files = FanOut(handles)
+            write_head, write_nodes, write_elements = writers[(version, binary)]
+            write_head(all_files)
+            for fh, (scale, _) in zip(handles, variants):
+                write_nodes(fh, self.node_coords if scale == 1 else self.node_coords * scale)
+            write_elements(all_files)
+
+    def write_physical_names(self, fh, binary: bool = False):
+        lines = [f"{len(self.physical_names)}\n"]
+        lines += ["{} {} {}\n".format(name["dim"], name["id"], name["name"]) for name in self.physical_names]
+        text = "$PhysicalNames\n" + "".join(lines) + "$EndPhysicalNames\n"
+        fh.write(text.encode() if binary else text)
+
+    def write_head(self, fh):
+        fh.write("$MeshFormat\n2.2 0 8\n$EndMeshFormat\n")  #Header
+        self.write_physical_names(fh)
+
+    def write_nodes(self, fh, coords: np.ndarray):
+        fh.write("$Nodes\n")
+        fh.write(f"{self.node_count}\n")
+        write_table(fh, "%d %.16e %.16e %.16e\n", [self.node_ids, coords], self.write_stats["Nodes"])
+        fh.write("$EndNodes\n")
+
+    def physical_blocks(self) -> list:
+        """
+        Element blocks of gmsh 2.2, where an element carries a single physical tag. Elements of a 4.1 entity with
+        several physical groups are written once per physical tag like the 2.2 export of gmsh, the further
+        copies are numbered after the largest element id.
+        :return: list of ElementBlock
+        """
+        shared = {key: physicals[1:] for key, physicals in self.entities.items() if len(physicals) > 1}
+        if not shared:
+            return self.element_blocks
+        next_id = max((int(block.ids.max()) for block in self.element_blocks if len(block)), default=0) + 1
+        blocks = []
+        for block in self.element_blocks:
+            blocks.append(block)
+            if block.tags.shape[1] < 2:
+                continue
+            dimension = GMSH_DIMENSION_PER_TYPE[block.type]
+            for (entity_dimension, entity), physicals in shared.items():
+                rows = block.tags[:, 1] == entity
+                if entity_dimension != dimension or not rows.any():
+                    continue
+                for physical in physicals.tolist():
+                    tags = block.tags[rows].copy()
+                    tags[:, 0] = physical
+                    ids = np.arange(next_id, next_id + len(tags), dtype=INDEX_DTYPE)
+                    blocks.append(ElementBlock(block.type, ids, block.nodes[rows], tags, block.mesh_type))
+                    next_id += len(tags)
+        return blocks
+
+    def write_elements(self, fh):
+        blocks = self.physical_blocks()
+        fh.write("$Elements\n")
+        fh.write(f"{sum(len(block) for block in blocks)}\n")
+        for block in blocks:
+            tag_count, node_count = block.tags.shape[1], block.nodes.shape[1]
+            row_format = "%d {} {} {} {}\n".format(block.type, tag_count, " ".join(["%d"] * tag_count),
+                                                   " ".join(["%d"] * node_count))
+            write_table(fh, row_format, [block.ids, block.tags, block.nodes], self.write_stats["Elements"])
+        fh.write("$EndElements\n")
+
+    def write_binary_head(self, fh):
+        """
+        Writes gmsh 2.2 binary format, little endian with int32 ids and float64 coordinates
+        """
+        fh.write(b"$MeshFormat\n2.2 1 8\n" + np.array(1, dtype="<i4").tobytes() + b"\n$EndMeshFormat\n")
+        self.write_physical_names(fh, binary=True)
+
+    def write_binary_nodes(self, fh, coords: np.ndarray):
+        fh.write(b"$Nodes\n")
+        fh.write(f"{self.node_count}\n".encode())
+        write_binary_table(fh, [self.node_ids, coords], ["<i4", "<f8"], self.write_stats["Nodes"])
+        fh.write(b"\n$EndNodes\n")
+
+    def write_binary_elements(self, fh):
+        blocks = self.physical_blocks()
+        fh.write(b"$Elements\n")
+        fh.write(f"{sum(len(block) for block in blocks)}\n".encode())
+        for block in blocks:
+            fh.write(np.array([block.type, len(block), block.tags.shape[1]], dtype="<i4").tobytes())
+            write_binary_table(fh, [block.ids, block.tags, block.nodes], ["<i4"] * 3, self.write_stats["Elements"])
+        fh.write(b"\n$EndElements\n")
+
+    # gmsh 4.1 -------------------------------------------------------------------
+    def entity_nodes(self) -> dict:
+        """
+        Derives the gmsh 4.1 entities from the elementary tags of the elements. The physical tags of an entity
+        are all physical tags of its elements and of the entity read from a 4.1 file. All nodes are placed on the
+        first entity of the highest dimension.
+        :return: {(dimension, entity tag): (physical tags, node indices)} sorted by dimension and tag
+        """
+        physicals, nodes = {}, {}
+        for block in self.element_blocks:
+            physical, entity = self.element_entities(block)
+            dimension = GMSH_DIMENSION_PER_TYPE[block.type]
+            for tag in np.unique(entity):
+                rows = entity == tag
+                physicals.setdefault((dimension, int(tag)), []).append(physical[rows])
+                nodes.setdefault((dimension, int(tag)), []).append(block.nodes[rows].ravel())
+        self.node_entity = max(nodes, key=lambda key: (key[0], -key[1]), default=(3, 1))
+        entities = {}
+        for key in sorted(set(nodes) | {self.node_entity}):
+            read = self.entities.get(key, np.empty(0, dtype=INDEX_DTYPE))
+            tags = np.unique(np.concatenate(physicals.get(key, []) + [read]))
+            indices = (np.arange(len(self.node_ids)) if key == self.node_entity else
+                       self.node_index(np.unique(np.concatenate(nodes[key]))))
+            entities[key] = (tags[tags != 0], indices)
+        return entities
+
+    def entity_blocks(self) -> list:
+        """
+        Splits the element blocks by entity, the rows keep their order within an entity
+        :return: list of (dimension, entity tag, type, ids, nodes)
+        """
+        blocks = []
+        for block in self.element_blocks:
+            _, entity = self.element_entities(block)
+            dimension = GMSH_DIMENSION_PER_TYPE[block.type]
+            tags = np.unique(entity)
+            if len(tags) == 1:
+                blocks.append((dimension, int(tags[0]), block.type, block.ids, block.nodes))
+                continue
+            order = np.argsort(entity, kind="stable")
+            bounds = np.searchsorted(entity[order], np.append(tags, tags[-1] + 1))
+            for tag, start, end in zip(tags, bounds[:-1], bounds[1:]):
+                rows = order[start:end]
+                blocks.append((dimension, int(tag), block.type, block.ids[rows], block.nodes[rows]))
+        return blocks
+
+    def entity_records(self, coords: np.ndarray) -> list:
+        """
+        :return: (dimension, entity tag, point coordinates or bounding box, physical tags) per entity
+        """
+        records = []
+        for (dimension, tag), (physicals, indices) in self.write_entities.items():
+            points = coords[indices] if len(indices) else np.zeros((1, 3), dtype=COORD_DTYPE)
+            box = points[0] if dimension == 0 else np.concatenate((points.min(axis=0), points.max(axis=0)))
+            records.append((dimension, tag, box, physicals))
+        return records
+
+    def entity_counts(self) -> list:
+        return [sum(1 for dimension, _ in self.write_entities if dimension == d) for d in range(4)]
+
+    @staticmethod
+    def tag_range(ids: list) -> tuple:
+        ids = [values for values in ids if len(values)]
+        return (min(int(values.min()) for values in ids), max(int(values.max()) for values in ids)) if ids else (0, 0)
+
+    def write_head41(self, fh):
+        fh.write("$MeshFormat\n4.1 0 8\n$EndMeshFormat\n")
+        self.write_physical_names(fh)
+
+    def write_nodes41(self, fh, coords: np.ndarray):
+        """
+        Writes the Entities and the Nodes section, the bounding boxes of the entities depend on the coordinates
+        """
+        fh.write("$Entities\n")
+        fh.write("{} {} {} {}\n".format(*self.entity_counts()))
+        for dimension, tag, box, physicals in self.entity_records(coords):
+            fh.write(" ".join([str(tag)] + [f"{value:.16g}" for value in box] + [str(len(physicals))] +
+                              [str(value) for value in physicals] + (["0"] if dimension else [])) + "\n")
+        fh.write("$EndEntities\n")
+
+        fh.write("$Nodes\n")
+        fh.write("1 {} {} {}\n".format(self.node_count, *self.tag_range([self.node_ids])))
+        fh.write("{} {} 0 {}\n".format(*self.node_entity, self.node_count))
+        write_table(fh, "%d\n", [self.node_ids], self.write_stats["Nodes"])
+        write_table(fh, "%.16e %.16e %.16e\n", [coords], self.write_stats["Nodes"])
+        fh.write("$EndNodes\n")
+
+    def write_elements41(self, fh):
+        blocks = self.entity_blocks()
+        fh.write("$Elements\n")
+        fh.write("{} {} {} {}\n".format(len(blocks), self.element_count,
+                                        *self.tag_range([ids for _, _, _, ids, _ in blocks])))
+        for dimension, tag, type, ids, nodes in blocks:
+            fh.write(f"{dimension} {tag} {type} {len(ids)}\n")
+            write_table(fh, "%d" + " %d" * nodes.shape[1] + "\n", [ids, nodes], self.write_stats["Elements"])
+        fh.write("$EndElements\n")
+
+    def write_binary_head41(self, fh):
+        """
+        Writes gmsh 4.1 binary format, little endian with 8 byte size_t tags and float64 coordinates
+        """
+        fh.write(b"$MeshFormat\n4.1 1 8\n" + np.array(1, dtype="<i4").tobytes() + b"\n$EndMeshFormat\n")
+        self.write_physical_names(fh, binary=True)
+
+    def write_binary_nodes41(self, fh, coords: np.ndarray):
+        fh.write(b"$Entities\n")
+        fh.write(np.array(self.entity_counts(), dtype="<u8").tobytes())
+        for dimension, tag, box, physicals in self.entity_records(coords):
+            fh.write(np.array(tag, dtype="<i4").tobytes() + np.asarray(box, dtype="<f8").tobytes() +
+                     np.array(len(physicals), dtype="<u8").tobytes() + np.asarray(physicals, dtype="<i4").tobytes() +
+                     (np.array(0, dtype="<u8").tobytes() if dimension else b""))
+        fh.write(b"\n$EndEntities\n")
+
+        fh.write(b"$Nodes\n")
+        fh.write(np.array([1, self.node_count, *self.tag_range([self.node_ids])], dtype="<u8").tobytes())
+        fh.write(np.array([*self.node_entity, 0], dtype="<i4").tobytes() +
+                 np.array(self.node_count, dtype="<u8").tobytes())
+        write_binary_table(fh, [self.node_ids], ["<u8"], self.write_stats["Nodes"])
+        write_binary_table(fh, [coords], ["<f8"], self.write_stats["Nodes"])
+        fh.write(b"\n$EndNodes\n")
+
+    def write_binary_elements41(self, fh):
+        blocks = self.entity_blocks()
+        fh.write(b"$Elements\n")
+        fh.write(np.array([len(blocks), self.element_count, *self.tag_range([ids for _, _, _, ids, _ in blocks])],
+                          dtype="<u8").tobytes())
+        for dimension, tag, type, ids, nodes in blocks:
+            fh.write(np.array([dimension, tag, type], dtype="<i4").tobytes() +
+                     np.array(len(ids), dtype="<u8").tobytes())
+            write_binary_table(fh, [ids, nodes], ["<u8", "<u8"], self.write_stats["Elements"])
+        fh.write(b"\n$EndElements\n")
+
+    def __str__(self):
+        return (f"Gmsh {self.version}, Nodes:{self.node_count}, Elements: {self.element_count}, "
+                f"Faces:{len(self.triangles)}, Tetrahedra:{len(self.tetrahedra)}")
+
+
+class GmshIndex:
+    """
+    Lazy view of a gmsh .msh file (2.2 or 4.1, ASCII or binary). Opening memory maps the file and records the
+    byte range of every $Section in one scan, only the small MeshFormat, PhysicalNames and Entities sections
+    are parsed. Nodes, elements or the elements of single physical groups are parsed when they are requested,
+    the operating system only reads the pages of the file that are touched. Binary sections are used in place.
+    The map is closed by close() or at the end of a with block, the file stays open (and locked on Windows)
+    until then.
+    :param file_name: path of the .msh file
+    :param chunk_bytes: size of the parts in which ASCII elements are filtered by physical group
+    """
+    def __init__(self, file_name, chunk_bytes: int = LAZY_CHUNK_BYTES):
         if not file_name[-4:] == ".msh":
             file_name += ".msh"
-        with open(file_name, 'w') as fh:
-            fh.write("$MeshFormat\n2.2 0 8\n$EndMeshFormat\n")  #Header
+        self.file_name = file_name
+        self.chunk_bytes = chunk_bytes
+        with open(file_name, "rb") as fh:
+            self.data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self.sections = gmsh_sections(self.data)
+        # the arrays are collected in a Gmsh object, which parses the sections exactly like read_files
+        self.gmsh = Gmsh()
+        self.gmsh.binary, self.gmsh.byte_order, self.gmsh.entities = False, "<", {}
+        for name in ("MeshFormat", "PhysicalNames", "Entities"):
+            if name in self.sections:
+                self.gmsh.section_handler(name, self.section(name))
+        self.loaded = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        """
+        Closes the memory map. Arrays that binary sections provided in place are copied into the Gmsh object
+        before, so mesh() stays valid. Arrays of binary files returned by nodes() or elements() are views into
+        the map and have to be copied by the caller before closing.
+        """
+        if self.data.closed:
+            return
+        copies = {}
+
+        def unmapped(array):
+            base = array
+            while isinstance(base, np.ndarray):
+                base = base.base
+            if not isinstance(base, memoryview):
+                return array
+            if id(array) not in copies:
+                copies[id(array)] = array.copy()
+            return copies[id(array)]
+
+        gmsh = self.gmsh
+        gmsh.node_ids, gmsh.node_coords = unmapped(gmsh.node_ids), unmapped(gmsh.node_coords)
+        for block in gmsh.element_blocks + [gmsh.triangle_block, gmsh.tetrahedron_block]:
+            if block._ids is not None:
+                block._ids = unmapped(block._ids)
+            block.nodes, block.tags = unmapped(block.nodes), unmapped(block.tags)
+        if gmsh._topology is not None:
+            gmsh._topology.source = unmapped(gmsh._topology.source)
+        copies.clear()
+        try:
+            self.data.close()
+        except BufferError as error:
+            raise BufferError(f"Arrays of {self.file_name} are still in use, copy them before closing") from error
+
+    def section(self, name: str) -> memoryview:
+        start, end = self.sections[name]
+        return memoryview(self.data)[start:end]
+
+    def load(self, name: str):
+        if name not in self.loaded:
+            self.gmsh.section_handler(name, self.section(name))
+            self.loaded.add(name)
+
+    @property
+    def physical_names(self) -> list:
+        return self.gmsh.physical_names
+
+    def nodes(self) -> tuple:
+        """
+        :return: node ids (N,), coords (N, 3)
+        """
+        self.load("Nodes")
+        return self.gmsh.node_ids, self.gmsh.node_coords
 
-            fh.write("$PhysicalNames\n")
-            fh.write(f"{len(self.physical_names)}\n")
+    def elements(self) -> list:
+        """
+        :return: list of ElementBlock of all elements
+        """
+        self.load("Elements")
+        return self.gmsh.element_blocks
+
+    def mesh(self) -> "Gmsh":
+        """
+        :return: the complete mesh, the same as Gmsh.read_files
+        """
+        self.load("Nodes")
+        self.load("Elements")
+        self.gmsh.check_data_and_convert()
+        return self.gmsh
+
+    def physical_tag(self, group) -> int:
+        """
+        :param group: physical tag or name
+        """
+        if isinstance(group, str):
             for name in self.physical_names:
-                fh.write("{} {} {}\n".format(name["dim"], name["id"], name["name"]))
-            fh.write("$EndPhysicalNames\n")
-
-            fh.write("$Nodes\n")
-            fh.write(f"{self.node_count}\n")
-            for node in self.nodes:
-                fh.write("{} {:.16e} {:.16e} {:.16e}\n".format(
-                    node["id"], node["coords"][0], node["coords"][1], node["coords"][2]))
-            fh.write("$EndNodes\n")
-
-            fh.write("$Elements\n")
-            fh.write(f"{self.element_count}\n")
-            for element in self.elements:
-                fh.write("{} {} {} {} {}\n".format(
-                    element["id"], element["type"], element["tag_count"],
-                    "".join(map(lambda x: str(x)+" ", element["tags"])).strip(),
-                    "".join(map(lambda x: str(x)+" ",element["nodes"])).strip()))
-            fh.write("$EndElements\n")
-
-    def read_mesh(self, mesh: MeshType):
-        self.nodes = mesh.nodes
-        self.node_count = mesh.node_count
-        self.physical_names = mesh.physical_names
-        self.elements = mesh.elements
-        self.element_count = mesh.element_count
-        self.triangles = mesh.triangles
-        self.tetrahedra = mesh.tetrahedra
+                if name["name"].strip('"') == group.strip('"'):
+                    return int(name["id"])
+            raise ValueError(f"Unknown physical group! Expected:{[name['name'] for name in self.physical_names]}, "
+                             f"Value:{group}")
+        return int(group)
+
+    def physical_elements(self, group) -> list:
+        """
+        Elements of one physical group with the tags physical, elementary. Only the matching elements are kept:
+        gmsh 4.1 skips the entity blocks of other groups, 2.2 filters the element rows part by part.
+        :param group: physical tag or name
+        :return: list of ElementBlock in order of first appearance of the type
+        """
+        tag = self.physical_tag(group)
+        if self.gmsh.version == "4.1":  # the elements only carry the first physical tag of their entity
+            return self._elements41(tag)
+        blocks = self.gmsh.element_blocks if "Elements" in self.loaded else self._elements22(tag)
+        return [block for block in (self.select(block, tag) for block in blocks) if len(block)]
+
+    @staticmethod
+    def select(block: ElementBlock, tag: int) -> ElementBlock:
+        """
+        :return: the elements of block with the physical tag
+        """
+        mask = block.tags[:, 0] == tag if block.tags.shape[1] else np.zeros(len(block), dtype=bool)
+        return ElementBlock(block.type, block.ids[mask], block.nodes[mask], block.tags[mask])
+
+    def _elements22(self, tag: int) -> list:
+        if self.gmsh.binary:  # views into the file, only the selected rows are copied
+            return parse_gmsh_elements_binary(self.section("Elements"), self.gmsh.byte_order)[1]
+        start, end = self.sections["Elements"]
+        start = self.data.find(b"\n", start, end) + 1  # count line
+        blocks = []
+        for chunk_start, chunk_end in line_ranges(self.data, start, end, self.chunk_bytes):
+            blocks += [self.select(block, tag) for block in parse_gmsh_element_rows(self.data[chunk_start:chunk_end])]
+        return merge_blocks(blocks)
+
+    def _elements41(self, tag: int) -> list:
+        entities = {key for key, physicals in self.gmsh.entities.items() if tag in physicals}
+        start, end = self.sections["Elements"]
+        blocks = []
+        if self.gmsh.binary:
+            reader = SectionReader(self.section("Elements"), True, self.gmsh.byte_order)
+            block_count = int(reader.read("size", 4)[0])
+            for _ in range(block_count):
+                dimension, entity, type = (int(value) for value in reader.read("int", 3))
+                block_size = reader.read_int("size")
+                columns = 1 + GMSH_NODES_PER_TYPE[type]
+                if (dimension, entity) in entities:
+                    rows = reader.read("size", block_size * columns).reshape(block_size, columns)
+                    blocks.append((type, entity, rows))
+                else:
+                    reader.position += block_size * columns * 8
+        else:
+            position, (block_count, _, _, _) = self._line(start, end)
+            for _ in range(block_count):
+                position, (dimension, entity, type, block_size) = self._line(position, end)
+                block_end = self._skip_lines(position, block_size, end)
+                if (dimension, entity) in entities:
+                    rows = np.fromstring(self.data[position:block_end], dtype=np.int64, sep=" ")
+                    blocks.append((type, entity, rows.reshape(block_size, 1 + GMSH_NODES_PER_TYPE[type])))
+                position = block_end
+        return merge_blocks([ElementBlock(type, rows[:, 0], rows[:, 1:],
+                                          np.column_stack([np.full(len(rows), tag), np.full(len(rows), entity)]))
+                             for type, entity, rows in blocks])
+
+    def _line(self, position: int, end: int) -> tuple:
+        """
+        :return: position after the line, integers of the line
+        """
+        line_end = self.data.find(b"\n", position, end)
+        line_end = end if line_end == -1 else line_end
+        return line_end + 1, [int(value) for value in self.data[position:line_end].split()]
+
+    def _skip_lines(self, position: int, count: int, end: int) -> int:
+        """
+        :return: position after count more lines, newlines are searched in parts of chunk_bytes
+        """
+        while count:
+            chunk = np.frombuffer(self.data, dtype=np.uint8, count=min(self.chunk_bytes, end - position),
+                                  offset=position)
+            if not len(chunk):
+                raise ValueError(f"Section ends early! Expected:{count} more lines, Value:0")
+            newlines = np.flatnonzero(chunk == ord("\n"))
+            if len(newlines) >= count:
+                return position + int(newlines[count - 1]) + 1
+            count -= len(newlines)
+            position += len(chunk)
+        return position
 
     def __str__(self):
-        return (f"Gmsh 2.2, Nodes:{self.node_count}, Elements: {self.element_count}, "
-                f"Faces:{len(self.triangles)}, Tetrahedra:{len(self.tetrahedra)}")
+        return f"Gmsh {self.gmsh.version} index of {self.file_name}, Sections: {', '.join(self.sections)}"
 
 
 class Tetgen(MeshType):
     def __init__(self, mesh=None):
         super().__init__(mesh)
 
-    def reset_data(self):
-        self.nodes = []
-        self.node_count = 0
-        self.physical_names = []
-        self.elements = []
-        self.element_count = 0
-        self.triangles = []
-        self.tetrahedra = []
+    def source_files(self, file_name) -> list:
+        if ".ele" in file_name or ".face" in file_name or ".node" in file_name:
+            file_name = file_name.rsplit(".", 1)[0]
+        files = [file_name + ".node", file_name + ".face", file_name + ".ele"]
+        # the topology files are optional, see read_topology
+        return files + [file_name + suffix for suffix in (".neigh", ".edge") if os.path.exists(file_name + suffix)]
 
-    def read_files(self, file_name):
+    def read_files(self, file_name, processes: int = 1):
+        """
+        :param file_name: path of the files with or without suffix
+        :param processes: worker processes to parse the files in parts, 1 parses serially
+        """
         if ".ele" in file_name or ".face" in file_name or ".node" in file_name:
             file_name = file_name.rsplit(".", 1)[0]
         self.reset_data()
-        self.read_nodes(file_name)
-        self.read_faces(file_name)
-        self.read_tetrahedra(file_name)
+        with parallel_pool(processes) if processes > 1 else nullcontext() as pool:
+            self.read_nodes(file_name, pool)
+            self.read_faces(file_name, pool)
+            self.read_tetrahedra(file_name, pool)
 
-        self.check_data_and_convert()
+            self.check_data_and_convert()
+            self.read_topology(file_name, pool)
 
-    def read_nodes(self, file_name):
-        with open(file_name + ".node") as fh:
-            first_line = []
-            for line in fh:
-                if line[0] == "#": continue  # skip comments
-                if not any(first_line):  # read header line
-                    first_line = line
-                    self.node_count = int(first_line.split()[0])
-                    continue
-                self.nodes.append(create_node("tetgen", line))
-
-    def read_faces(self, file_name):
-        with open(file_name+".face") as fh:
-            first_line = []
-            for line in fh:
-                if line[0] == "#": continue  # skip comments
-                if not any(first_line):  # read header line
-                    first_line = line
-                    self.element_count += int(first_line.split()[0])
-                    continue
-                self.triangles.append(create_element("tetgen", line, config={"nodes_per_element": 3}))
-
-    def read_tetrahedra(self, file_name):
-        with open(file_name + ".ele") as fh:
-            first_line = []
-            for line in fh:
-                if line[0] == "#": continue  # skip comments
-                if not any(first_line):  # read header line
-                    first_line = line
-                    self.element_count += int(first_line.split()[0])
-                    continue
-                self.tetrahedra.append(create_element("tetgen", line, config={"nodes_per_element": 4}))
+    def read_topology(self, file_name, pool=None):
+        """
+        Seeds the topology index with the .neigh (-n) and .edge (-e) files written by TetGen, if present
+        """
+        neighbours = edges = None
+        if os.path.exists(file_name + ".neigh"):
+            _, body = read_tetgen_file(file_name + ".neigh", pool)
+            first_id = body[0, 0] if len(body) else 1
+            neighbours = np.where(body[:, 1:5] < 0, -1, body[:, 1:5] - first_id).astype(INDEX_DTYPE)
+        if os.path.exists(file_name + ".edge"):
+            _, body = read_tetgen_file(file_name + ".edge", pool)
+            edges = self.node_index(body[:, 1:3])
+        self._topology = MeshTopology(self.node_index(self.tetrahedron_block.nodes), len(self.node_ids),
+                                      neighbours, edges, source=self.tetrahedron_block.nodes)
+
+    def read_nodes(self, file_name, pool=None):
+        header, body = read_tetgen_file(file_name + ".node", pool)
+        if header[1] != 3:
+            raise ValueError(f"Only 3 dimensional nodes supported, got dimension {header[1]}")
+        self.node_count = header[0]
+        self.node_ids = body[:, 0].astype(INDEX_DTYPE)
+        self.node_coords = np.ascontiguousarray(body[:, 1:4])
+        self.node_attributes = np.ascontiguousarray(body[:, 4:4+header[2]+header[3]])
+
+    def read_faces(self, file_name, pool=None):
+        header, body = read_tetgen_file(file_name + ".face", pool)
+        self.element_count += header[0]
+        self.triangle_block = ElementBlock(2, body[:, 0], body[:, 1:4], body[:, 4:4+header[1]], "tetgen")
+
+    def read_tetrahedra(self, file_name, pool=None):
+        header, body = read_tetgen_file(file_name + ".ele", pool)
+        if header[1] != 4:
+            raise ValueError(f"Only 4-node tetrahedra supported, got {header[1]} nodes per element")
+        self.element_count += header[0]
+        self.tetrahedron_block = ElementBlock(4, body[:, 0], body[:, 1:5], body[:, 5:5+header[2]], "tetgen")
 
     def check_data_and_convert(self):
-        if not self.node_count == len(self.nodes):
-            raise ValueError(f"Node counts do not match! Expected:{self.node_count}, Value:{len(self.nodes)}")
-        if not self.element_count == len(self.triangles) + len(self.tetrahedra):
-            raise ValueError(f"Element counts do not match! Expected:{self.element_count}, Value:{len(self.elements)}")
-        self.elements = copy.deepcopy(self.triangles)
-        tetra_local = copy.deepcopy(self.tetrahedra)
-        for tetra in tetra_local:
-            tetra["id"] += len(self.triangles)
-            self.elements.append(tetra)
+        if not self.node_count == len(self.node_ids):
+            raise ValueError(f"Node counts do not match! Expected:{self.node_count}, Value:{len(self.node_ids)}")
+        element_total = len(self.triangle_block) + len(self.tetrahedron_block)
+        if not self.element_count == element_total:
+            raise ValueError(f"Element counts do not match! Expected:{self.element_count}, Value:{element_total}")
+        # combined numbering: triangles 1 ... T, tetrahedra T+1 ... T+N, arrays are shared
+        self.element_blocks = [self.triangle_block.renumbered(),
+                               self.tetrahedron_block.renumbered(len(self.triangle_block))]
 
     def write_files(self, file_name):
         if ".ele" in file_name or ".face" in file_name or ".node" in file_name:
             file_name = file_name.rsplit(".", 1)[0]
 
+        self.write_stats = {".node": {}, ".face": {}, ".ele": {}}
         with open(file_name + ".node", 'w') as fnode:
             fnode.write(f"# Generated by Python Convert Script\n")
             fnode.write(f"{self.node_count} 3 0 0\n")
-            for node in self.nodes:
-                fnode.write("{:>5} {:.16e} {:.16e} {:.16e}\n".format(
-                    node["id"], node["coords"][0], node["coords"][1], node["coords"][2]))
+            write_table(fnode, "%5d %.16e %.16e %.16e\n", [self.node_ids, self.node_coords], self.write_stats[".node"])
 
         with open(file_name + ".face", 'w') as fface:
             fface.write(f"# Generated by Python Convert Script\n")
-            fface.write(f"{len(self.triangles)}  0\n")
-            for triangle in self.triangles:
-                fface.write("{:>5} {} {}\n".format(triangle["id"],
-                                                "".join(map(lambda x: "{:>6}".format(str(x)), triangle["nodes"])),
-                                                "".join(map(lambda x: str(x)+" ", triangle["tags"])).strip()))
+            block = self.triangle_block
+            fface.write(f"{len(self.triangles)}  {tetgen_tag_count(block)}\n")
+            row_format = "%5d {} {}\n".format("%6d" * 3, " ".join([tag_format(block)] * block.tags.shape[1]))
+            write_table(fface, row_format, [block.ids, block.nodes, block.tags], self.write_stats[".face"])
 
         with open(file_name + ".ele", 'w') as fele:
             fele.write(f"# Generated by Python Convert Script\n")
-            fele.write(f"{len(self.tetrahedra)}  4  0\n")
-            for tetra in self.tetrahedra:
-                fele.write("{:>5}  {} {}\n".format(tetra["id"],
-                                               "".join(map(lambda x: "{:>6}".format(str(x)), tetra["nodes"])),
-                                               "".join(map(lambda x: str(x) + " ", tetra["tags"])).strip()))
-
-    def read_mesh(self, mesh: MeshType):
-        self.nodes = mesh.nodes
-        self.node_count = mesh.node_count
-        self.physical_names = mesh.physical_names
-        self.elements = mesh.elements
-        self.element_count = mesh.element_count
-        self.triangles = mesh.triangles
-        self.tetrahedra = mesh.tetrahedra
+            block = self.tetrahedron_block
+            fele.write(f"{len(self.tetrahedra)}  4  {tetgen_tag_count(block)}\n")
+            row_format = "%5d  {} {}\n".format("%6d" * 4, " ".join([tag_format(block)] * block.tags.shape[1]))
+            write_table(fele, row_format, [block.ids, block.nodes, block.tags], self.write_stats[".ele"])
 
     def __str__(self):
         return (f"Tetgen, Nodes:{self.node_count}, Elements: {self.element_count}, "
                 f"Faces:{len(self.triangles)}, Tetrahedra:{len(self.tetrahedra)}")
 
 
+# Cache ----------------------------------------------------------------------
+class MeshCache:
+    """
+    On-disk cache of parsed meshes. Every entry is a directory with one .npy file per array and a
+    manifest.json, named by a hash of the content of the source files. Changed source files therefore
+    never hit an old entry. Entries are loaded with np.load(mmap_mode="r"), so loading costs almost nothing
+    until the data is accessed. Besides the arrays the gmsh file format and entities and the known
+    neighbours and edges of the topology are restored, a cached mesh equals the one of read_files.
+    If the cache grows beyond max_bytes the least recently used entries are removed.
+    :param directory: cache directory
+    :param max_bytes: size cap of all entries together
+    """
+    def __init__(self, directory: str = "./Out/mesh_cache", max_bytes: int = 4 * 1024**3):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def key(self, mesh_type: str, files: list) -> str:
+        digest = hashlib.blake2b(mesh_type.encode(), digest_size=16)
+        for file_name in files:
+            digest.update(Path(file_name).name.encode())
+            with open(file_name, "rb") as fh:
+                for chunk in iter(lambda: fh.read(1 << 24), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    def load(self, key: str, mesh: MeshType) -> bool:
+        """
+        Fills mesh with the memory mapped arrays of an entry
+        :return: False if there is no entry for key
+        """
+        entry = self.directory / key
+        try:
+            with open(entry / "manifest.json") as fh:
+                manifest = json.load(fh)
+        except FileNotFoundError:
+            return False
+        os.utime(entry / "manifest.json")  # mark as recently used
+
+        def array(name):
+            return None if name is None else np.load(entry / name, mmap_mode="r")
+
+        def block(description):
+            return ElementBlock(description["type"], array(description["ids"]), array(description["nodes"]),
+                                array(description["tags"]), description["mesh_type"], description["id_offset"])
+
+        mesh.reset_data()
+        mesh.node_ids = array(manifest["node_ids"])
+        mesh.node_coords = array(manifest["node_coords"])
+        mesh.node_attributes = array(manifest["node_attributes"])
+        mesh.node_count = manifest["node_count"]
+        mesh.physical_names = manifest["physical_names"]
+        mesh.element_blocks = [block(description) for description in manifest["element_blocks"]]
+        mesh.element_count = manifest["element_count"]
+        mesh.triangle_block = block(manifest["triangle_block"])
+        mesh.tetrahedron_block = block(manifest["tetrahedron_block"])
+        for name, value in manifest["attributes"].items():
+            setattr(mesh, name, value)
+        if manifest["entities"] is not None:
+            mesh.entities = {(dimension, tag): np.array(physicals, dtype=INDEX_DTYPE)
+                             for dimension, tag, physicals in manifest["entities"]}
+        if manifest["topology"] is not None:
+            mesh._topology = MeshTopology(mesh.node_index(mesh.tetrahedron_block.nodes), len(mesh.node_ids),
+                                          array(manifest["topology"]["neighbours"]),
+                                          array(manifest["topology"]["edges"]), source=mesh.tetrahedron_block.nodes)
+        return True
+
+    def store(self, key: str, mesh: MeshType):
+        """
+        Writes the arrays of mesh as a new entry, arrays shared between blocks are stored once
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        staging = self.directory / f"{key}.tmp{os.getpid()}"
+        staging.mkdir(exist_ok=True)
+        stored = {}
+
+        def array(values):
+            if values is None:
+                return None
+            if id(values) not in stored:
+                stored[id(values)] = f"{len(stored)}.npy"
+                np.save(staging / stored[id(values)], values)
+            return stored[id(values)]
+
+        def block(element_block):
+            return {"type": element_block.type, "mesh_type": element_block.mesh_type,
+                    "id_offset": element_block.id_offset, "ids": array(element_block._ids),
+                    "nodes": array(element_block.nodes), "tags": array(element_block.tags)}
+
+        manifest = {
+            "node_ids": array(mesh.node_ids),
+            "node_coords": array(mesh.node_coords),
+            "node_attributes": array(mesh.node_attributes),
+            "node_count": mesh.node_count,
+            "physical_names": mesh.physical_names,
+            "element_blocks": [block(element_block) for element_block in mesh.element_blocks],
+            "element_count": mesh.element_count,
+            "triangle_block": block(mesh.triangle_block),
+            "tetrahedron_block": block(mesh.tetrahedron_block),
+            "attributes": {name: getattr(mesh, name) for name in ("version", "binary", "byte_order")
+                           if hasattr(mesh, name)},
+            "entities": None if not hasattr(mesh, "entities") else
+            [[dimension, tag, physicals.tolist()] for (dimension, tag), physicals in mesh.entities.items()],
+            # only relations that are already known, e.g. seeded from TetGen .neigh and .edge files
+            "topology": None if mesh._topology is None else
+            {name: array(mesh._topology.__dict__.get(name)) for name in ("neighbours", "edges")},
+        }
+        with open(staging / "manifest.json", "w") as fh:
+            json.dump(manifest, fh)
+        try:
+            staging.rename(self.directory / key)
+        except OSError:  # stored concurrently by another process
+            shutil.rmtree(staging)
+        self.evict()
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache is below max_bytes. Staging directories of store
+        are skipped, the ones left behind by processes that died are removed.
+        """
+        entries = []
+        for entry in self.directory.iterdir():
+            if ".tmp" in entry.name:
+                if time.time() - entry.stat().st_mtime > CACHE_STAGING_SECONDS:
+                    shutil.rmtree(entry, ignore_errors=True)
+                continue
+            manifest = entry / "manifest.json"
+            if entry.is_dir() and manifest.exists():
+                size = sum(file.stat().st_size for file in entry.iterdir())
+                entries.append((manifest.stat().st_mtime, size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry)
+            total -= size
+
+
 if __name__ == "__main__":
 
     subprocess.run(["tetgen.exe", "-pq", Path("./Out/nVolume.stl")])
 
     mesh_tetgen = Tetgen()
-    mesh_tetgen.read_files("./Out/nVolume.1.node")
+    mesh_tetgen.read_cached("./Out/nVolume.1.node")
+    if "--reorder" in sys.argv:
+        report = mesh_tetgen.reorder_nodes()
+        print("Node bandwidth: {} -> {}, profile: {} -> {}".format(
+            report["before"]["bandwidth"], report["after"]["bandwidth"],
+            report["before"]["profile"], report["after"]["profile"]))
     mesh_gmsh = Gmsh(mesh_tetgen)
     mesh_gmsh.write_files("./Out/nVolume_meshed.msh")
@@ -1,40 +1,39 @@
-import gmsh
+import importlib
 import sys
 
 plot = False
 
-gmsh.initialize()
-gmsh.open("./Out/nVolume_meshed.msh")
-
-gmsh.model.occ.synchronize()
-
-gmsh.model.mesh.classifySurfaces(0)
-
-id_surf_top = gmsh.model.getEntitiesInBoundingBox(-0.1, -0.1, 0.9, 1.1, 1.1, 1.1, 2)[0][1]
-id_surf_bot = gmsh.model.getEntitiesInBoundingBox(-0.1, -0.1, -0.1, 1.1, 1.1, 0.1, 2)[0][1]
-
-# Physical Groups
-grp_epi = gmsh.model.addPhysicalGroup(3, [0], 1, "Bulk")
-
-contact_diodeA = gmsh.model.addPhysicalGroup(2, [id_surf_top], 2, "top")
-contact_diodeB = gmsh.model.addPhysicalGroup(2, [id_surf_bot], 3, "bot")
-
-gmsh.model.occ.synchronize()
-
-gmsh.option.setNumber("Mesh.MshFileVersion", 2.2)
-
-gmsh.option.setNumber("Mesh.ScalingFactor", 1.0)
-gmsh.write("./Out/nVolume_contacts_scaling_1.msh")
-
-gmsh.option.setNumber("Mesh.ScalingFactor", 1.0e-5)
-gmsh.write("./Out/nVolume_contacts_scaling_1e-5.msh")
-
-gmsh.option.setNumber("Mesh.ScalingFactor", 10.0)
-gmsh.write("./Out/nVolume_contacts_scaling_10.msh")
+# the converter is handed over in memory, no intermediate .msh file
+convert = importlib.import_module("02_mesh_tetgen_and_convert")
+mesh = convert.Tetgen()
+mesh.read_cached("./Out/nVolume.1.node")
+
+# reverse Cuthill-McKee node order, reduces the bandwidth of the devsim system matrix
+if "--reorder" in sys.argv:
+    report = mesh.reorder_nodes()
+    print("Node bandwidth: {} -> {}, profile: {} -> {}".format(
+        report["before"]["bandwidth"], report["after"]["bandwidth"],
+        report["before"]["profile"], report["after"]["profile"]))
+
+# Physical Groups, the contacts are the planes inside of the boxes
+mesh.define_physical_groups("Bulk", {
+    "top": (-0.1, -0.1, 0.9, 1.1, 1.1, 1.1),
+    "bot": (-0.1, -0.1, -0.1, 1.1, 1.1, 0.1),
+})
+
+# the connectivity is formatted once for all unit systems, only the nodes are scaled per file
+convert.Gmsh(mesh).write_scaled_files([
+    (1.0, "./Out/nVolume_contacts_scaling_1.msh"),
+    (1.0e-5, "./Out/nVolume_contacts_scaling_1e-5.msh"),
+    (10.0, "./Out/nVolume_contacts_scaling_10.msh"),
+])
 
 if plot:
+    import gmsh
+    gmsh.initialize()
+    mesh.to_gmsh_model("nVolume")
     # Launch the GUI to see the results:
     if '-nopopup' not in sys.argv:
         gmsh.fltk.run()
 
-    gmsh.finalize()
\ No newline at end of file
+    gmsh.finalize()
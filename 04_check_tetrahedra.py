@@ -12,107 +12,109 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from devsim import *
+import importlib
+import sys
+from pathlib import Path
 import numpy
-import matplotlib.pyplot as plt
+import mesh_quality
+import vtu_writer
 
+# tetrahedra are listed one by one up to this count, larger meshes only print the summary
+print_limit = 100
+# without devsim the control volumes are only computed by mesh_quality, run with --no-devsim
+use_devsim = "--no-devsim" not in sys.argv
+plot = '-nopopup' not in sys.argv
 
-def calculations_for_tet(index):
-    xs = []
-    ys = []
-    zs = []
-    radius = 0
-    for i in range(4):
-        ni = elements[index][i]
-        xs.append(x[ni])
-        ys.append(y[ni])
-        zs.append(z[ni])
-
-    mymat = numpy.zeros((3, 3))
-    myrhs = numpy.zeros((3,1))
-    n0 = elements[index][0]
-    for i in range(3):
-        ni = elements[index][i+1]
-        v = coordinate[ni] - coordinate[n0]
-        myrhs[i] = 0.5*numpy.dot(v, v.T)
-        mymat[i, :] = coordinate[ni] - coordinate[n0]
-
-    # print(mymat)
-    # print(myrhs)
-    foo = numpy.linalg.solve(mymat, myrhs) + coordinate[n0].T
-    radius = 0.0
-
-    for i in range(4):
-        ni = elements[mytet][i]
-        v = coordinate[ni] - foo.T
-        radius = numpy.linalg.norm(v)
-    return xs, ys, zs, radius, foo
 
 mesh="./Out/nVolume_contacts_scaling_1.msh"
 #mesh="./Out/nVolume_contacts_scaling_1e-5.msh"
 #mesh="./Out/nVolume_contacts_scaling_10.msh"
 
-create_gmsh_mesh(file=mesh, mesh="volume3d")
-add_gmsh_region( mesh="volume3d" , gmsh_name="Bulk" , region="Bulk" , material="Silicon")
-finalize_mesh( mesh="volume3d")
-create_device( mesh="volume3d" , device="resistor3d")
-#write_devices( file="gmsh_resistor3d_out.msh")
-
-device="resistor3d"
-region="Bulk"
-
-elements = get_element_node_list(device=device, region=region)
-
-x = get_node_model_values(device=device, region=region, name="x")
-y = get_node_model_values(device=device, region=region, name="y")
-z = get_node_model_values(device=device, region=region, name="z")
-
-coordinate = numpy.matrix([list(a) for a in zip(x, y, z)])
-
-#print coordinate[1]
-vol = 0.0
-tetras = []
-tetrahedron_volumes = [None]*len(elements)
-actual_volumes = [None]*len(elements)
-element_node_volumes = get_element_model_values(device=device, region=region, name="ElementNodeVolume")
-
-for tet_index, e in enumerate(elements):
-    v = [None]*3
-    for i in range(3):
-        v[i] = coordinate[e[i+1]] - coordinate[e[0]]
-
-    tet_vol = float(numpy.abs(numpy.dot(numpy.cross(v[0], v[1]), v[2].T)) / 6.0)
-    vol += tet_vol
-    actual_vol = sum([abs(q) for q in element_node_volumes[6*tet_index:6*(tet_index+1)]])
-    actual_volumes[tet_index] = 2 * actual_vol
-    tetrahedron_volumes[tet_index] = tet_vol
-    tetras.append({
-        "id": tet_index,
-        "tetra_volume": tet_vol,
-        "actual_volume": 2 * actual_vol,
-        "ratio": 2 * actual_vol / tet_vol
-    })
-
-ratios = numpy.array([actual_volumes[i] / tetrahedron_volumes[i] for i in range(len(actual_volumes))])
+if use_devsim:
+    from devsim import *
+    create_gmsh_mesh(file=mesh, mesh="volume3d")
+    add_gmsh_region( mesh="volume3d" , gmsh_name="Bulk" , region="Bulk" , material="Silicon")
+    finalize_mesh( mesh="volume3d")
+    create_device( mesh="volume3d" , device="resistor3d")
+    #write_devices( file="gmsh_resistor3d_out.msh")
+
+    device="resistor3d"
+    region="Bulk"
+
+    elements = get_element_node_list(device=device, region=region)
+
+    x = get_node_model_values(device=device, region=region, name="x")
+    y = get_node_model_values(device=device, region=region, name="y")
+    z = get_node_model_values(device=device, region=region, name="z")
+
+    coordinate = numpy.column_stack([x, y, z])
+    tetrahedra = numpy.array(elements)
+    element_node_volumes = get_element_model_values(device=device, region=region, name="ElementNodeVolume")
+else:
+    convert = importlib.import_module("02_mesh_tetgen_and_convert")
+    gmsh_mesh = convert.Gmsh()
+    gmsh_mesh.read_cached(mesh)
+    coordinate = gmsh_mesh.node_coords
+    tetrahedra = gmsh_mesh.node_index(gmsh_mesh.tetrahedron_block.nodes)
+
+# all tetrahedra at once, see mesh_quality
+quality = mesh_quality.tetrahedron_quality(coordinate, tetrahedra)
+tetrahedron_volumes = numpy.abs(quality["volume"])
+control_volumes = mesh_quality.control_volumes(coordinate, tetrahedra)
+if use_devsim:
+    actual_volumes = mesh_quality.element_volumes(element_node_volumes)
+    difference = numpy.abs(actual_volumes - control_volumes["element_volumes"]).max()
+    print(f"{difference}\tLargest difference of devsim and box method element volumes")
+else:
+    actual_volumes = control_volumes["element_volumes"]
+ratios = mesh_quality.volume_ratios(actual_volumes, tetrahedron_volumes)
+quality["volume_ratio"] = ratios
 max_ratio = numpy.max(ratios)
 maxtet = numpy.where(ratios == max_ratio)[0][0]
 
 print("")
 print("Tetrahedron Stats: -----------------------------------------------------------------")
-for tetra in tetras:
-    print("id: {:>3}, ratio: {:.2f}, tetra volume: {:.4e}, actual volume: {:.4e}".format(
-        tetra["id"], tetra["ratio"], tetra["tetra_volume"], tetra["actual_volume"]))
+if len(tetrahedra) <= print_limit:
+    for tet_index in range(len(tetrahedra)):
+        print("id: {:>3}, ratio: {:.2f}, tetra volume: {:.4e}, actual volume: {:.4e}".format(
+            tet_index, ratios[tet_index], tetrahedron_volumes[tet_index], actual_volumes[tet_index]))
+# devsim sorts the nodes of each element, only the converter connectivity keeps the orientation
+summary = mesh_quality.quality_summary(quality, oriented=not use_devsim)
+for name in ("circumradius", "radius_edge_ratio", "dihedral_angle", "volume_ratio"):
+    print("{:<18} min: {:.4e}, max: {:.4e}, mean: {:.4e}".format(
+        name, summary[name]["min"], summary[name]["max"], summary[name]["mean"]))
+orientation = f"inverted: {summary['inverted']}, " if "inverted" in summary else ""
+print(f"tetrahedra: {summary['tetrahedra']}, {orientation}"
+      f"degenerate: {summary['degenerate']}, max ratio at id: {maxtet}")
+print(f"non-Delaunay tetrahedra (negative edge couples): {numpy.count_nonzero(control_volumes['non_delaunay'])}")
 print("------------------------------------------------------------------------------------")
-print(f"{sum(actual_volumes)}\tVolume calculated from tetrahedra edge volumes")
-print(f"{sum(tetrahedron_volumes)}\tVolume from tetrahedra")
+print(f"{actual_volumes.sum()}\tVolume calculated from tetrahedra edge volumes")
+print(f"{tetrahedron_volumes.sum()}\tVolume from tetrahedra")
+
+# quality measures per tetrahedron and box method volumes per node for ParaView
+vtu_writer.write_vtu(f"./Out/{Path(mesh).stem}_quality.vtu", coordinate, tetrahedra,
+                     point_data={"node_volume": control_volumes["node_volumes"]},
+                     cell_data={"volume": tetrahedron_volumes if use_devsim else quality["volume"],
+                                "circumradius": quality["circumradius"],
+                                "radius_edge_ratio": quality["radius_edge_ratio"],
+                                "min_dihedral_angle": quality["dihedral_angles"].min(axis=1),
+                                "max_dihedral_angle": quality["dihedral_angles"].max(axis=1),
+                                "volume_ratio": ratios, "non_delaunay": control_volumes["non_delaunay"]})
 
 
 
+if not plot:
+    sys.exit()
+
+import matplotlib.pyplot as plt
 mytet = 3
-xs, ys, zs, radius, foo = calculations_for_tet(mytet)
+points = coordinate[tetrahedra[mytet]]
+xs, ys, zs = points[:, 0], points[:, 1], points[:, 2]
+foo = quality["circumcenter"][mytet]
+radius = quality["circumradius"][mytet]
 ax = plt.axes(projection='3d')
 ax.set_aspect('equal')
-ax.set_title("tetrahedron index: {}, ratio: {:.2f}".format(tetras[mytet]["id"], tetras[mytet]["ratio"]))
+ax.set_title("tetrahedron index: {}, ratio: {:.2f}".format(mytet, ratios[mytet]))
 
 for i in range(4):
     for j in range(i+1, 4):
@@ -123,9 +125,9 @@ for i in range(4):
 
 for i in range(4):
     ax.plot(
-        (xs[i], foo[0].item()),
-        (ys[i], foo[1].item()),
-        (zs[i], foo[2].item()), 'k'
+        (xs[i], foo[0]),
+        (ys[i], foo[1]),
+        (zs[i], foo[2]), 'k'
     )
 
 mid_x = foo[0]
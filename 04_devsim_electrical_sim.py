@@ -4,44 +4,30 @@
 
 from devsim import *
 from devsim.python_packages.simple_physics import *
+import importlib
+import os
+import sys
 import diode_common
+import solver_instrumentation
+import vtu_writer
 
-def print_currents(device, contact):
-    """
-    Print out contact currents
-    """
-    ece_name = "ElectronContinuityEquation"
-    hce_name = "HoleContinuityEquation"
-    contact_bias_name = GetContactBiasName(contact)
-    electron_current= get_contact_current(device=device, contact=contact, equation=ece_name)
-    hole_current    = get_contact_current(device=device, contact=contact, equation=hce_name)
-    total_current   = electron_current + hole_current
-    voltage = get_parameter(device=device, name=GetContactBiasName(contact))
-    data = (voltage, electron_current, hole_current, total_current)
-    print(f"{contact:10}{voltage:+.3e}\t{electron_current:+.3e}\t{hole_current:+.3e}\t{total_current:+.3e}")
-    return data
-
-def print_all_currents():
-    """
-    Prints all currents to console and returns outmap of values. !Currently only functional when all contacts are
-    silicon contacts!
-    :return:
-    """
-    print("\nSolution:")
-    print("{0:10}{1:15}{2:12}{3:12}{4:10}".format("Contact", "Voltage", "Electron", "Hole", "Total"))
-    print("                         Current     Current     Current")
-    device_list = get_device_list()
-    for device in device_list:
-        contact_list = get_contact_list(device=device)
-        outmap = {}
-        for contact in contact_list:
-                outmap[contact] = print_currents(device, contact)
-    return outmap
+convert = importlib.import_module("02_mesh_tetgen_and_convert")
 
 device = "nVolume"
 region = "Bulk"
+# the sweep is saved after every bias point, --restart continues from the last one
+checkpoint = "./Out/nVolume_checkpoint.npz"
+restart = None
+if "--restart" in sys.argv and os.path.exists(checkpoint):
+    restart = diode_common.LoadCheckpoint(checkpoint)
 
-diode_common.Create3DGmshMesh(device, region, "./Out/nVolume_contacts_scaling_1.msh.msh")
+# timing, Newton iterations and residuals of every phase, --summary prints them as a table
+instrumentation = solver_instrumentation.SolverInstrumentation()
+
+with instrumentation.phase("mesh load"):
+    mesh = convert.Gmsh()
+    mesh.read_cached("./Out/nVolume_contacts_scaling_1.msh")
+diode_common.Create3DGmshMeshFromArrays(device, region, mesh, instrumentation)
 
 diode_common.SetParameters(device=device, region=region)
 set_parameter(device=device, region=region, name="mu_n", value=1)
@@ -66,7 +52,9 @@ diode_common.InitialSolution(device, region)
 ####
 #### Initial DC solution
 ####
-solve(type="dc", absolute_error=1.0, relative_error=1e-12, maximum_iterations=100)
+if not restart:
+    instrumentation.solve("equilibrium potential", type="dc", absolute_error=1.0, relative_error=1e-12,
+                          maximum_iterations=100)
 
 ###
 ### Drift diffusion simulation at equilibrium
@@ -74,14 +62,28 @@ solve(type="dc", absolute_error=1.0, relative_error=1e-12, maximum_iterations=10
 
 diode_common.DriftDiffusionInitialSolution(device, region)
 
-solve(type="dc", absolute_error=1e-10, relative_error=1e-12, maximum_iterations=50)
-
-v = 0.1
-while v < 1.01:
-    set_parameter(device=device, name=GetContactBiasName("top"), value=v)
-    solve(type="dc", absolute_error=1e-10, relative_error=1e-12, maximum_iterations=30)
-    print_all_currents()
-    v += 0.1
+if not restart:
+    instrumentation.solve("equilibrium drift diffusion", type="dc", absolute_error=1e-10, relative_error=1e-12,
+                          maximum_iterations=50)
+
+# warm started sweep with adaptive steps, the currents are printed at each of the bias points
+biases = diode_common.BiasPoints(0.1, 1.0, 0.1)
+# currents of all contacts at each bias point, printed unless --quiet
+iv = diode_common.IVCollector(device, len(biases), print_points="--quiet" not in sys.argv)
+for point in restart["points"] if restart else []:
+    iv.add(point["record"])
+sweep = diode_common.BiasSweep(device, "top", biases, callback=iv.record, checkpoint=checkpoint, restart=restart,
+                               instrumentation=instrumentation,
+                               absolute_error=1e-10, relative_error=1e-12, maximum_iterations=30)
+print(f"\nNewton iterations: {sum(point['iterations'] for point in sweep)}, "
+      f"retries: {sum(point['retries'] for point in sweep)}")
+
+iv.write_csv("./Out/nVolume_iv.csv")
+iv.write_npz("./Out/nVolume_iv.npz")
+instrumentation.write_json("./Out/nVolume_solver_stats.json")
+instrumentation.write_csv("./Out/nVolume_solver_stats.csv")
+if "--summary" in sys.argv:
+    print(instrumentation.summary())
 
 element_from_edge_model(edge_model="ElectricField",   device=device, region=region)
 element_from_edge_model(edge_model="ElectronCurrent", device=device, region=region)
@@ -91,3 +93,8 @@ element_from_edge_model(edge_model="HoleCurrent",     device=device, region=regi
 #write_devices(file="gmsh_nVolume_dd.msh", type="devsim")
 #write_devices(file="gmsh_nVolume_dd.msh", type="vtk")
 
+# binary VTU with the solution and the element fields, loads quickly in ParaView also for large meshes
+vtu_writer.device_vtu("./Out/nVolume_dd.vtu", device, region,
+                      node_models=("Potential", "Electrons", "Holes", "NetDoping"),
+                      element_models=("ElectricField", "ElectronCurrent", "HoleCurrent"))
+
@@ -4,6 +4,11 @@
 
 from devsim import *
 from devsim.python_packages.simple_physics import *
+import json
+import math
+import os
+import numpy
+from solver_instrumentation import measured
 #####
 # dio1
 #
@@ -69,14 +74,30 @@ def Create2DGmshMesh(device, region):
     finalize_mesh    (mesh="diode2d")
     create_device    (mesh="diode2d", device=device)
 
-def Create3DGmshMesh(device, region, file):
+def Create3DGmshMesh(device, region, file, instrumentation=None):
     #this reads in the gmsh format
-    create_gmsh_mesh (mesh="diode3d", file=file)
+    with measured(instrumentation, "create_gmsh_mesh"):
+        create_gmsh_mesh (mesh="diode3d", file=file)
     add_gmsh_region  (mesh="diode3d", gmsh_name="Bulk",    region=region, material="Silicon")
     add_gmsh_contact (mesh="diode3d", gmsh_name="top",    region=region, material="metal", name="top")
     add_gmsh_contact (mesh="diode3d", gmsh_name="bot", region=region, material="metal", name="bot")
-    finalize_mesh    (mesh="diode3d")
-    create_device    (mesh="diode3d", device=device)
+    with measured(instrumentation, "finalize_mesh"):
+        finalize_mesh    (mesh="diode3d")
+    with measured(instrumentation, "create_device"):
+        create_device    (mesh="diode3d", device=device)
+
+def Create3DGmshMeshFromArrays(device, region, mesh, instrumentation=None):
+    #this builds the gmsh mesh from the arrays of a converter mesh (02_mesh_tetgen_and_convert), no file is read
+    with measured(instrumentation, "create_gmsh_mesh", nodes=len(mesh.node_ids), tetrahedra=len(mesh.tetrahedra)):
+        coordinates, physical_names, elements = mesh.to_devsim_arrays()
+        create_gmsh_mesh (mesh="diode3d", coordinates=coordinates, physical_names=physical_names, elements=elements)
+    add_gmsh_region  (mesh="diode3d", gmsh_name="Bulk",    region=region, material="Silicon")
+    add_gmsh_contact (mesh="diode3d", gmsh_name="top",    region=region, material="metal", name="top")
+    add_gmsh_contact (mesh="diode3d", gmsh_name="bot", region=region, material="metal", name="bot")
+    with measured(instrumentation, "finalize_mesh"):
+        finalize_mesh    (mesh="diode3d")
+    with measured(instrumentation, "create_device"):
+        create_device    (mesh="diode3d", device=device)
 
 def Create3DGmshMeshNew(device, region):
     #this reads in the gmsh format
@@ -145,6 +166,281 @@ def DriftDiffusionInitialSolution(device, region, circuit_contacts=None):
             CreateSiliconDriftDiffusionAtContact(device, region, i)
 
 
+# solution variables carried from one bias point to the next, carrier densities are extrapolated in log scale
+SWEEP_VARIABLES = ("Potential", "Electrons", "Holes")
+LOG_VARIABLES = ("Electrons", "Holes")
+
+def BiasPoints(start, stop, step):
+    '''
+      Bias points start + i * step up to and including stop, computed from i instead of accumulating the step
+    '''
+    count = int(round((stop - start) / step))
+    return [round(start + i * step, 12) for i in range(count + 1)]
+
+def SaveSolution(device, variables=SWEEP_VARIABLES):
+    return {(region, name): numpy.array(get_node_model_values(device=device, region=region, name=name))
+            for region in get_region_list(device=device)
+            for name in variables if name in get_node_model_list(device=device, region=region)}
+
+def RestoreSolution(device, solution):
+    for (region, name), values in solution.items():
+        set_node_values(device=device, region=region, name=name, values=values.tolist())
+
+def ExtrapolateSolution(previous, last, fraction):
+    '''
+      Linear extrapolation last + fraction * (last - previous), in log scale for positive carrier densities
+    '''
+    solution = {}
+    for key, values in last.items():
+        if key[1] in LOG_VARIABLES and numpy.all(values > 0) and numpy.all(previous[key] > 0):
+            solution[key] = numpy.exp(numpy.log(values) + fraction * (numpy.log(values) - numpy.log(previous[key])))
+        else:
+            solution[key] = values + fraction * (values - previous[key])
+    return solution
+
+def SaveCheckpoint(device, file_name, history, points=()):
+    '''
+      Writes the converged solutions of a sweep and the bias parameters of all contacts to a .npz file.
+      The file is replaced at once, a crash while writing leaves the previous checkpoint intact.
+      :param history: list of (bias, solution of SaveSolution), the last one or two converged points
+      :param points: results of the finished bias points
+    '''
+    arrays = {"biases": numpy.array([bias for bias, _ in history]), "points": numpy.array(json.dumps(list(points)))}
+    for number, (_, solution) in enumerate(history):
+        for (region, name), values in solution.items():
+            arrays[f"solution{number}/{region}/{name}"] = values
+    for contact in get_contact_list(device=device):
+        name = GetContactBiasName(contact)
+        arrays[f"parameter/{name}"] = numpy.array(get_parameter(device=device, name=name))
+    temporary = file_name + ".tmp"
+    with open(temporary, "wb") as fh:
+        numpy.savez(fh, **arrays)
+    os.replace(temporary, file_name)
+
+def LoadCheckpoint(file_name):
+    '''
+      :return: dict history (list of (bias, solution)), parameters (name -> value), points (finished bias points)
+    '''
+    with numpy.load(file_name) as data:
+        history = [(float(bias), {}) for bias in data["biases"]]
+        parameters = {}
+        for key in data.files:
+            kind, _, name = key.partition("/")
+            if kind == "parameter":
+                parameters[name] = float(data[key])
+            elif kind.startswith("solution"):
+                region, name = name.split("/")
+                history[int(kind[len("solution"):])][1][(region, name)] = data[key]
+        points = json.loads(str(data["points"]))
+    return {"history": history, "parameters": parameters, "points": points}
+
+def RestoreCheckpoint(device, checkpoint):
+    '''
+      Sets the last solution and the contact bias parameters of a checkpoint, on the same mesh. Also used to
+      warm start a related run, e.g. with another doping.
+    '''
+    solution = checkpoint["history"][-1][1]
+    for (region, name), values in solution.items():
+        node_count = len(get_node_model_values(device=device, region=region, name="x"))
+        if node_count != len(values):
+            raise ValueError(f"Checkpoint does not match the mesh of region {region}! "
+                             f"Expected:{node_count}, Value:{len(values)}")
+    RestoreSolution(device, solution)
+    for name, value in checkpoint["parameters"].items():
+        set_parameter(device=device, name=name, value=value)
+
+def BiasSweep(device, contact, biases, callback=None, initial_step=None, maximum_step=None, minimum_step=1e-4,
+              fast_iterations=4, growth=2.0, cutback=0.5, checkpoint=None, restart=None, instrumentation=None,
+              **solve_arguments):
+    '''
+      Ramps the bias of contact through the points in biases. Each solve starts from the solution extrapolated
+      from the last two converged points. The step grows after solves with at most fast_iterations Newton
+      iterations, a failed solve is retried from the last converged point with the step cut back.
+      Intermediate points are inserted as needed, callback(bias) is called at every point of biases and
+      a returned value is kept as "record" of the point, e.g. the currents of IVCollector.record.
+      solve_arguments are passed on to solve, e.g. absolute_error, relative_error, maximum_iterations
+      :param checkpoint: file name, SaveCheckpoint after every point of biases
+      :param restart: result of LoadCheckpoint, the sweep continues after its finished points
+      :param instrumentation: SolverInstrumentation, every solve is recorded as phase "bias <contact>=<bias>"
+      :return: list of dict bias, iterations (Newton iterations of all solves), retries, record for each point of
+               biases
+    '''
+    bias_name = GetContactBiasName(contact)
+    results = []
+    if restart:
+        RestoreCheckpoint(device, restart)
+        results = list(restart["points"])
+        finished = {point["bias"] for point in results}
+        biases = [target for target in biases if target not in finished]
+    bias = get_parameter(device=device, name=bias_name)
+    history = restart["history"] if restart else [(bias, SaveSolution(device))]
+    if not biases:
+        return results
+    if initial_step:
+        step = abs(initial_step)
+    else:
+        # a sweep starting at the current bias (e.g. 0 V) takes the step to the first point that needs a solve
+        distances = [abs(target - bias) for target in biases if target != bias]
+        spacings = [abs(second - first) for first, second in zip(biases, biases[1:]) if second != first]
+        step = distances[0] if distances else (spacings[0] if spacings else 0.0)
+    maximum_step = maximum_step or math.inf
+    for target in biases:
+        point = {"bias": target, "iterations": 0, "retries": 0}
+        # a target at the current bias is not solved again, only recorded
+        while bias != target:
+            distance = target - bias
+            trial = target if abs(distance) <= step * (1 + 1e-9) else bias + math.copysign(step, distance)
+            if len(history) == 2 and history[0][0] != history[1][0]:
+                (previous_bias, previous), (last_bias, last) = history
+                fraction = (trial - last_bias) / (last_bias - previous_bias)
+                RestoreSolution(device, ExtrapolateSolution(previous, last, fraction))
+            set_parameter(device=device, name=bias_name, value=trial)
+            if instrumentation:
+                result = instrumentation.solve(f"bias {contact}={trial:.6g}", check=False, type="dc", **solve_arguments)
+            else:
+                result = solve(type="dc", info=True, **solve_arguments)
+            point["iterations"] += len(result["iterations"])
+            if not result["converged"]:
+                RestoreSolution(device, history[-1][1])
+                set_parameter(device=device, name=bias_name, value=bias)
+                point["retries"] += 1
+                step *= cutback
+                if step < minimum_step:
+                    raise RuntimeError(f"Bias sweep of {contact} failed at {trial} V, step below {minimum_step} V")
+                continue
+            bias = trial
+            history = [history[-1], (bias, SaveSolution(device))]
+            if len(result["iterations"]) <= fast_iterations:
+                step = min(step * growth, maximum_step)
+        if callback:
+            record = callback(target)
+            if record is not None:
+                point["record"] = record
+        results.append(point)
+        if checkpoint:
+            SaveCheckpoint(device, checkpoint, history, results)
+    return results
+
+
+def _Grown(values, size):
+    grown = numpy.full((size,) + values.shape[1:], numpy.nan)
+    grown[:len(values)] = values
+    return grown
+
+class IVCollector:
+    '''
+      Collects the currents of all contacts at each bias point into preallocated arrays, which grow by doubling
+      if more points are recorded. The curve is written once as CSV or NPZ, printing each point is optional.
+      Arrays with one row per point and one column per contact: voltage, electron, hole.
+    '''
+    def __init__(self, device, points=16, contacts=None, print_points=False):
+        self.device = device
+        self.contacts = list(contacts or get_contact_list(device=device))
+        self.bias_names = [GetContactBiasName(contact) for contact in self.contacts]
+        self.print_points = print_points
+        self.count = 0
+        self.bias = numpy.full(points, numpy.nan)
+        self.arrays = {name: numpy.full((points, len(self.contacts)), numpy.nan)
+                       for name in ("voltage", "electron", "hole")}
+        if print_points:
+            print("{0:10}{1:15}{2:12}{3:12}{4:10}".format("Contact", "Voltage", "Electron", "Hole", "Total"))
+            print("                         Current     Current     Current")
+
+    def __len__(self):
+        return self.count
+
+    def record(self, bias=None):
+        '''
+          Reads the currents of all contacts at the current solution, usable as BiasSweep callback
+          :param bias: value of the swept bias, stored in the bias column
+          :return: the point as dict of lists, see add
+        '''
+        point = {"bias": bias, "voltage": [], "electron": [], "hole": []}
+        for contact, bias_name in zip(self.contacts, self.bias_names):
+            point["voltage"].append(get_parameter(device=self.device, name=bias_name))
+            point["electron"].append(get_contact_current(device=self.device, contact=contact,
+                                                         equation="ElectronContinuityEquation"))
+            point["hole"].append(get_contact_current(device=self.device, contact=contact,
+                                                     equation="HoleContinuityEquation"))
+        self.add(point)
+        if self.print_points:
+            for contact, voltage, electron, hole in zip(self.contacts, point["voltage"], point["electron"],
+                                                        point["hole"]):
+                print(f"{contact:10}{voltage:+.3e}\t{electron:+.3e}\t{hole:+.3e}\t{electron + hole:+.3e}")
+        return point
+
+    def add(self, point):
+        '''
+          Appends a point recorded before, e.g. the points of a checkpoint
+          :param point: dict bias, voltage, electron, hole with one value per contact
+        '''
+        if self.count == len(self.bias):
+            size = max(2 * self.count, 1)
+            self.bias = _Grown(self.bias, size)
+            self.arrays = {name: _Grown(values, size) for name, values in self.arrays.items()}
+        self.bias[self.count] = numpy.nan if point["bias"] is None else point["bias"]
+        for name, values in self.arrays.items():
+            values[self.count] = point[name]
+        self.count += 1
+
+    def curve(self):
+        '''
+          :return: dict contacts, bias (n,) and voltage, electron, hole, total (n, contacts) of the recorded points
+        '''
+        curve = {"contacts": self.contacts, "bias": self.bias[:self.count].copy()}
+        curve.update({name: values[:self.count].copy() for name, values in self.arrays.items()})
+        curve["total"] = curve["electron"] + curve["hole"]
+        return curve
+
+    def write_csv(self, file_name):
+        '''
+          One line per bias point, columns bias and <contact>_voltage, _electron, _hole, _total per contact
+        '''
+        curve = self.curve()
+        columns = [curve["bias"][:, None]]
+        header = ["bias"]
+        for column, contact in enumerate(self.contacts):
+            for name in ("voltage", "electron", "hole", "total"):
+                columns.append(curve[name][:, column:column + 1])
+                header.append(f"{contact}_{name}")
+        numpy.savetxt(file_name, numpy.hstack(columns), fmt="%.16e", delimiter=",", header=",".join(header),
+                      comments="")
+
+    def write_npz(self, file_name):
+        curve = self.curve()
+        curve["contacts"] = numpy.array(curve["contacts"])
+        numpy.savez(file_name, **curve)
+
+def SimulateResistor(mesh, biases, donors=1.0/1.6*1e19, contact="top", mobility=1.0, device="nVolume", region="Bulk",
+                     **solve_arguments):
+    '''
+      Complete run of the 3D resistor of 04_devsim_electrical_sim.py in the current process: device from the gmsh
+      file, n doping, equilibrium solution and a BiasSweep of contact through biases.
+      :return: IVCollector.curve of the bias points and iterations (Newton iterations of the sweep)
+    '''
+    solve_arguments = {"absolute_error": 1e-10, "relative_error": 1e-12, "maximum_iterations": 30, **solve_arguments}
+    Create3DGmshMesh(device, region, mesh)
+    SetParameters(device=device, region=region)
+    set_parameter(device=device, region=region, name="mu_n", value=mobility)
+    set_parameter(device=device, region=region, name="mu_p", value=mobility)
+    set_parameter(name="extended_solver", value="True")
+    set_parameter(name="extended_model", value="True")
+    set_parameter(name="extended_equation", value="True")
+    node_model(device=device, region=region, name="Acceptors", equation="0.0")
+    node_model(device=device, region=region, name="Donors",    equation=repr(float(donors)))
+    node_model(device=device, region=region, name="NetDoping", equation="Donors-Acceptors;")
+    InitialSolution(device, region)
+    solve(type="dc", absolute_error=1.0, relative_error=1e-12, maximum_iterations=100)
+    DriftDiffusionInitialSolution(device, region)
+    solve(type="dc", absolute_error=1e-10, relative_error=1e-12, maximum_iterations=50)
+
+    collector = IVCollector(device, len(biases))
+    sweep = BiasSweep(device, contact, biases, callback=collector.record, **solve_arguments)
+    iv = collector.curve()
+    iv["iterations"] = sum(point["iterations"] for point in sweep)
+    return iv
+
+
 
 
 
@@ -0,0 +1,444 @@
+import importlib
+import sys
+from contextlib import ExitStack
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+
+# Vectorized quality measures of tetrahedral meshes. Every function works on the whole mesh at once,
+# the tetrahedra are processed in chunks of QUALITY_CHUNK_ROWS to bound the size of the temporaries.
+
+QUALITY_CHUNK_ROWS = 200000
+
+# Edges of a tetrahedron (n0, n1, n2, n3) and for each edge the two nodes not on it,
+# the dihedral angle at an edge lies between the faces opposite of these two nodes
+TETRAHEDRON_EDGES = np.array([[0, 1], [0, 2], [0, 3], [1, 2], [1, 3], [2, 3]])
+EDGE_OPPOSITE_NODES = np.array([[2, 3], [1, 3], [1, 2], [0, 3], [0, 2], [0, 1]])
+# Face opposite of node i
+TETRAHEDRON_FACES = np.array([[1, 2, 3], [0, 3, 2], [0, 1, 3], [0, 2, 1]])
+
+
+def tetrahedron_points(coords: np.ndarray, tetrahedra: np.ndarray) -> np.ndarray:
+    """
+    :param coords: node coordinates, shape (N, 3)
+    :param tetrahedra: node indices, shape (n, 4)
+    :return: corner coordinates, shape (n, 4, 3)
+    """
+    return np.asarray(coords, dtype=np.float64)[np.asarray(tetrahedra)]
+
+
+def signed_volumes(points: np.ndarray) -> np.ndarray:
+    """
+    :param points: corner coordinates, shape (n, 4, 3)
+    :return: signed volume, positive if n3 lies on the side of (n1 - n0) x (n2 - n0), shape (n,)
+    """
+    edges = points[:, 1:] - points[:, :1]
+    return np.einsum("ij,ij->i", np.cross(edges[:, 0], edges[:, 1]), edges[:, 2]) / 6.0
+
+
+def circumcenters(points: np.ndarray) -> np.ndarray:
+    """
+    Solves the 3x3 systems (n_i - n0) . c = |n_i - n0|^2 / 2 of all tetrahedra at once by Cramer's rule.
+    Degenerate tetrahedra give inf or nan.
+    :param points: corner coordinates, shape (n, 4, 3)
+    :return: circumcenters, shape (n, 3)
+    """
+    a, b, c = (points[:, i] - points[:, 0] for i in range(1, 4))
+    b_x_c, c_x_a, a_x_b = np.cross(b, c), np.cross(c, a), np.cross(a, b)
+    numerator = (np.einsum("ij,ij->i", a, a)[:, None] * b_x_c + np.einsum("ij,ij->i", b, b)[:, None] * c_x_a
+                 + np.einsum("ij,ij->i", c, c)[:, None] * a_x_b)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return points[:, 0] + numerator / (2.0 * np.einsum("ij,ij->i", a, b_x_c))[:, None]
+
+
+def edge_lengths(points: np.ndarray) -> np.ndarray:
+    """
+    :param points: corner coordinates, shape (n, 4, 3)
+    :return: length of the edges in order of TETRAHEDRON_EDGES, shape (n, 6)
+    """
+    return np.linalg.norm(points[:, TETRAHEDRON_EDGES[:, 1]] - points[:, TETRAHEDRON_EDGES[:, 0]], axis=2)
+
+
+def dihedral_angles(points: np.ndarray) -> np.ndarray:
+    """
+    Interior angles between the two faces at each edge, from the outward face normals n_k, n_l as
+    acos(-n_k . n_l)
+    :param points: corner coordinates, shape (n, 4, 3)
+    :return: angles in degree in order of TETRAHEDRON_EDGES, shape (n, 6)
+    """
+    faces = points[:, TETRAHEDRON_FACES]
+    normals = np.cross(faces[:, :, 1] - faces[:, :, 0], faces[:, :, 2] - faces[:, :, 0])
+    # orient away from the node opposite of the face, independent of the node order of the tetrahedron
+    inwards = np.einsum("ijk,ijk->ij", normals, points - faces[:, :, 0]) > 0
+    normals[inwards] *= -1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        normals /= np.linalg.norm(normals, axis=2, keepdims=True)
+    cosine = -np.einsum("ijk,ijk->ij", normals[:, EDGE_OPPOSITE_NODES[:, 0]], normals[:, EDGE_OPPOSITE_NODES[:, 1]])
+    return np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+
+
+def tetrahedron_quality(coords: np.ndarray, tetrahedra: np.ndarray, chunk_rows: int = QUALITY_CHUNK_ROWS) -> dict:
+    """
+    Computes the quality measures of all tetrahedra:
+        volume: signed volume (n,)
+        circumcenter: (n, 3)
+        circumradius: (n,)
+        edge_lengths: (n, 6)
+        radius_edge_ratio: circumradius / shortest edge (n,), sqrt(6) / 4 = 0.612 for the regular tetrahedron
+        dihedral_angles: degree (n, 6)
+    :param coords: node coordinates, shape (N, 3)
+    :param tetrahedra: node indices, shape (n, 4)
+    :param chunk_rows: number of tetrahedra per batch
+    """
+    tetrahedra = np.asarray(tetrahedra)
+    count = len(tetrahedra)
+    quality = {
+        "volume": np.empty(count),
+        "circumcenter": np.empty((count, 3)),
+        "circumradius": np.empty(count),
+        "edge_lengths": np.empty((count, 6)),
+        "radius_edge_ratio": np.empty(count),
+        "dihedral_angles": np.empty((count, 6)),
+    }
+    for start in range(0, count, chunk_rows):
+        rows = slice(start, start + chunk_rows)
+        points = tetrahedron_points(coords, tetrahedra[rows])
+        center = circumcenters(points)
+        lengths = edge_lengths(points)
+        radius = np.linalg.norm(points[:, 0] - center, axis=1)
+        quality["volume"][rows] = signed_volumes(points)
+        quality["circumcenter"][rows] = center
+        quality["circumradius"][rows] = radius
+        quality["edge_lengths"][rows] = lengths
+        with np.errstate(divide="ignore", invalid="ignore"):
+            quality["radius_edge_ratio"][rows] = radius / lengths.min(axis=1)
+        quality["dihedral_angles"][rows] = dihedral_angles(points)
+    return quality
+
+
+def element_volumes(element_node_volumes) -> np.ndarray:
+    """
+    Volume of each tetrahedron as seen by devsim, twice the sum of the 6 edge based ElementNodeVolume values
+    :param element_node_volumes: devsim ElementNodeVolume, 6 values per tetrahedron
+    :return: shape (n,)
+    """
+    return 2.0 * np.abs(np.asarray(element_node_volumes, dtype=np.float64).reshape(-1, 6)).sum(axis=1)
+
+
+def volume_ratios(actual_volumes: np.ndarray, volumes: np.ndarray) -> np.ndarray:
+    """
+    :param actual_volumes: control volume based tetrahedron volumes, e.g. element_volumes
+    :param volumes: geometric tetrahedron volumes, signed volumes are taken as absolute values
+    :return: ratio per tetrahedron, 1 for a mesh whose control volumes add up to the tetrahedra
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return actual_volumes / np.abs(volumes)
+
+
+def inverted_count(negative: int, positive: int) -> int:
+    """
+    Tetrahedra are inverted if the sign of their volume differs from the majority of the mesh, the node order
+    of a valid mesh may be either way round.
+    :param negative: number of tetrahedra with negative volume (clockwise node order)
+    :param positive: number of tetrahedra with positive volume
+    """
+    return min(negative, positive)
+
+
+def quality_summary(quality: dict, oriented: bool = True) -> dict:
+    """
+    :param oriented: the node order of the tetrahedra is the one of the mesh file. devsim returns the nodes of
+                     each element sorted (get_element_node_list), the sign of the volume carries no orientation
+                     and the inverted count is left out.
+    :return: minimum, maximum and mean of each scalar quality measure, worst tetrahedron index for the ratios
+    """
+    volume = quality["volume"]
+    summary = {
+        "tetrahedra": len(volume),
+        "total_volume": float(np.abs(volume).sum()),
+        "degenerate": int(np.count_nonzero(volume == 0)),
+    }
+    if oriented:
+        summary["inverted"] = inverted_count(int(np.count_nonzero(volume < 0)), int(np.count_nonzero(volume > 0)))
+    for name, values in (("circumradius", quality["circumradius"]),
+                         ("radius_edge_ratio", quality["radius_edge_ratio"]),
+                         ("dihedral_angle", quality["dihedral_angles"]),
+                         ("volume_ratio", quality.get("volume_ratio"))):
+        if values is None or not len(values):
+            continue
+        summary[name] = {"min": float(np.nanmin(values)), "max": float(np.nanmax(values)),
+                         "mean": float(np.nanmean(values))}
+        if values.ndim == 1:
+            summary[name]["argmax"] = int(np.nanargmax(values))
+    return summary
+
+
+# Control Volumes ------------------------------------------------------------
+def triangle_circumcenters(points: np.ndarray) -> np.ndarray:
+    """
+    :param points: corner coordinates, shape (..., 3, 3)
+    :return: circumcenters in the plane of the triangles, shape (..., 3)
+    """
+    u = points[..., 1, :] - points[..., 0, :]
+    v = points[..., 2, :] - points[..., 0, :]
+    w = np.cross(u, v)
+    numerator = np.cross(np.sum(u * u, axis=-1)[..., None] * v - np.sum(v * v, axis=-1)[..., None] * u, w)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return points[..., 0, :] + numerator / (2.0 * np.sum(w * w, axis=-1))[..., None]
+
+
+def edge_couples(points: np.ndarray, absolute: bool = False) -> np.ndarray:
+    """
+    Area of the part of the Voronoi face of each edge that lies inside the tetrahedron (box method). It is the
+    quadrilateral edge midpoint, circumcenter of one face at the edge, tetrahedron circumcenter, circumcenter of
+    the other face, measured normal to the edge, split into the two triangles at the tetrahedron circumcenter.
+    Signed, a triangle is negative if the circumcenter lies beyond the edge, which happens for obtuse and
+    non-Delaunay elements. Absolute, the areas of the two triangles are added like devsim does for the
+    ElementEdgeCouple.
+    :param points: corner coordinates, shape (n, 4, 3)
+    :param absolute: add the absolute areas of the two triangles
+    :return: couples in order of TETRAHEDRON_EDGES, shape (n, 6)
+    """
+    first, second = _edge_couple_triangles(points)
+    if absolute:
+        return np.abs(first) + np.abs(second)
+    return first + second
+
+
+def _edge_couple_triangles(points: np.ndarray) -> tuple:
+    """
+    :return: signed areas of the two triangles of the edge_couples quadrilateral, each shape (n, 6)
+    """
+    start, end = points[:, TETRAHEDRON_EDGES[:, 0]], points[:, TETRAHEDRON_EDGES[:, 1]]
+    other_a, other_b = points[:, EDGE_OPPOSITE_NODES[:, 0]], points[:, EDGE_OPPOSITE_NODES[:, 1]]
+    middle = 0.5 * (start + end)
+    # each face touches three edges, its circumcenter is computed once
+    face_centers = triangle_circumcenters(points[:, TETRAHEDRON_FACES])
+    face_a = face_centers[:, EDGE_OPPOSITE_NODES[:, 0]] - middle
+    face_b = face_centers[:, EDGE_OPPOSITE_NODES[:, 1]] - middle
+    center = circumcenters(points)[:, None] - middle
+    direction = end - start
+    # orient the quadrilateral like the triangle spanned by the two other nodes, positive for centered elements
+    orientation = np.sign(np.einsum("ijk,ijk->ij", np.cross(other_b - middle, other_a - middle), direction))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = 0.5 * orientation / np.linalg.norm(direction, axis=2)
+    return (np.einsum("ijk,ijk->ij", np.cross(face_a, center), direction) * scale,
+            np.einsum("ijk,ijk->ij", np.cross(center, face_b), direction) * scale)
+
+
+def control_volumes(coords: np.ndarray, tetrahedra: np.ndarray, tolerance: float = 1e-10,
+                    chunk_rows: int = QUALITY_CHUNK_ROWS) -> dict:
+    """
+    Element edge control volumes of the box method without devsim:
+        edge_couples: absolute couples, the counterpart of the devsim ElementEdgeCouple (n, 6), see edge_couples
+        element_node_volumes: couple * edge length / 6, the pyramid over the couple towards one edge node,
+                              the counterpart of the devsim ElementNodeVolume, (n, 6)
+        element_volumes: twice the sum of the element node volumes, equals the tetrahedron volume for elements
+                         without negative couple triangles and is larger otherwise (n,)
+        node_volumes: control volume of each node (N,)
+        negative_edges: edges with a signed couple below -tolerance * edge length^2 (n, 6)
+        non_delaunay: elements with at least one negative couple (n,)
+    The edges are in order of TETRAHEDRON_EDGES, not necessarily in the devsim order within an element.
+    :param coords: node coordinates, shape (N, 3)
+    :param tetrahedra: node indices, shape (n, 4)
+    :param tolerance: relative to the squared edge length, right angled elements have couples of zero
+                      that come out slightly negative by rounding
+    :param chunk_rows: number of tetrahedra per batch
+    """
+    tetrahedra = np.asarray(tetrahedra)
+    count = len(tetrahedra)
+    volumes = {
+        "edge_couples": np.empty((count, 6)),
+        "element_node_volumes": np.empty((count, 6)),
+        "node_volumes": np.zeros(len(coords)),
+        "negative_edges": np.empty((count, 6), dtype=bool),
+    }
+    for start in range(0, count, chunk_rows):
+        rows = slice(start, start + chunk_rows)
+        points = tetrahedron_points(coords, tetrahedra[rows])
+        first, second = _edge_couple_triangles(points)
+        couples = np.abs(first) + np.abs(second)
+        lengths = edge_lengths(points)
+        node_volumes = couples * lengths / 6.0
+        volumes["edge_couples"][rows] = couples
+        volumes["negative_edges"][rows] = first + second < -tolerance * lengths ** 2
+        volumes["element_node_volumes"][rows] = node_volumes
+        edge_nodes = tetrahedra[rows][:, TETRAHEDRON_EDGES]
+        volumes["node_volumes"] += np.bincount(edge_nodes.ravel(), np.repeat(node_volumes.ravel(), 2),
+                                               minlength=len(coords))
+    volumes["element_volumes"] = 2.0 * volumes["element_node_volumes"].sum(axis=1)
+    volumes["non_delaunay"] = volumes["negative_edges"].any(axis=1)
+    return volumes
+
+
+def mesh_control_volumes(mesh, tolerance: float = 1e-10) -> dict:
+    """
+    control_volumes of the tetrahedra of a converted mesh (MeshType of 02_mesh_tetgen_and_convert)
+    """
+    return control_volumes(mesh.node_coords, mesh.node_index(mesh.tetrahedron_block.nodes), tolerance)
+
+
+# Statistics -----------------------------------------------------------------
+# Fixed bin edges, so histograms of separate chunks add up to the histogram of the whole mesh
+HISTOGRAM_BINS = {
+    "radius_edge_ratio": np.append(np.linspace(0.5, 3.0, 26), np.inf),
+    "dihedral_angle": np.linspace(0.0, 180.0, 37),
+}
+WORST_COUNT = 10
+
+
+def chunk_statistics(coords: np.ndarray, tetrahedra: np.ndarray, offset: int = 0, worst_count: int = WORST_COUNT,
+                     tolerance: float = 1e-10) -> dict:
+    """
+    Reduces the quality and control volumes of a range of tetrahedra to sums, extrema, histograms and
+    the worst elements. Statistics of separate ranges are combined with merge_statistics.
+    :param coords: node coordinates of the whole mesh, shape (N, 3)
+    :param tetrahedra: node indices of the range, shape (n, 4)
+    :param offset: index of the first tetrahedron of the range in the mesh
+    :param worst_count: number of elements kept with the largest radius-edge ratio / smallest dihedral angle
+    :param tolerance: see control_volumes
+    """
+    quality = tetrahedron_quality(coords, tetrahedra)
+    volumes = control_volumes(coords, tetrahedra, tolerance)
+    ratio = quality["radius_edge_ratio"]
+    smallest_angle = quality["dihedral_angles"].min(axis=1, initial=np.inf)
+    index = np.arange(offset, offset + len(tetrahedra))
+    statistics = {
+        "tetrahedra": len(tetrahedra),
+        "volume": float(np.abs(quality["volume"]).sum()),
+        "control_volume": float(volumes["element_volumes"].sum()),
+        "negative_volume": int(np.count_nonzero(quality["volume"] < 0)),
+        "positive_volume": int(np.count_nonzero(quality["volume"] > 0)),
+        "degenerate": int(np.count_nonzero(quality["volume"] == 0)),
+        "non_delaunay": int(np.count_nonzero(volumes["non_delaunay"])),
+        "histograms": {name: np.histogram(values[np.isfinite(values)], bins)[0]
+                       for (name, bins), values in zip(HISTOGRAM_BINS.items(), (ratio, quality["dihedral_angles"]))},
+        "extrema": {name: (float(np.nanmin(values, initial=np.inf)), float(np.nanmax(values, initial=-np.inf)))
+                    for name, values in (("circumradius", quality["circumradius"]), ("radius_edge_ratio", ratio),
+                                         ("dihedral_angle", quality["dihedral_angles"]))},
+        "worst": {"radius_edge_ratio": _worst(np.nan_to_num(ratio, nan=np.inf), index, worst_count),
+                  "dihedral_angle": _worst(-smallest_angle, index, worst_count)},
+    }
+    statistics["worst"]["dihedral_angle"][0][:] *= -1
+    statistics["inverted"] = inverted_count(statistics["negative_volume"], statistics["positive_volume"])
+    return statistics
+
+
+def _worst(values: np.ndarray, index: np.ndarray, count: int) -> tuple:
+    """
+    :return: the count largest values and their element indices, sorted descending, ties by index
+    """
+    order = np.lexsort((index, -values))[:count]
+    return values[order], index[order]
+
+
+def merge_statistics(first: dict, second: dict, worst_count: int = WORST_COUNT) -> dict:
+    """
+    Combines the chunk_statistics of two ranges of tetrahedra
+    """
+    merged = {name: first[name] + second[name] for name in ("tetrahedra", "volume", "control_volume", "negative_volume",
+                                                            "positive_volume", "degenerate", "non_delaunay")}
+    # the majority orientation is the one of the whole mesh, not of the single ranges
+    merged["inverted"] = inverted_count(merged["negative_volume"], merged["positive_volume"])
+    merged["histograms"] = {name: first["histograms"][name] + second["histograms"][name]
+                            for name in first["histograms"]}
+    merged["extrema"] = {name: (min(first["extrema"][name][0], second["extrema"][name][0]),
+                                max(first["extrema"][name][1], second["extrema"][name][1]))
+                         for name in first["extrema"]}
+    merged["worst"] = {}
+    for name, sign in (("radius_edge_ratio", 1), ("dihedral_angle", -1)):
+        values = np.concatenate([first["worst"][name][0], second["worst"][name][0]])
+        index = np.concatenate([first["worst"][name][1], second["worst"][name][1]])
+        values, index = _worst(sign * values, index, worst_count)
+        merged["worst"][name] = (sign * values, index)
+    return merged
+
+
+# Worker side of parallel_statistics, the arrays are attached once per process from shared memory
+_shared = {}
+
+
+def _attach(specs: dict, worst_count: int, tolerance: float):
+    for name, (memory_name, shape, dtype) in specs.items():
+        memory = shared_memory.SharedMemory(name=memory_name)
+        _shared[name] = (memory, np.ndarray(shape, dtype=dtype, buffer=memory.buf))
+    _shared["options"] = (worst_count, tolerance)
+
+
+def _range_statistics(bounds: tuple) -> dict:
+    start, stop = bounds
+    worst_count, tolerance = _shared["options"]
+    return chunk_statistics(_shared["coords"][1], _shared["tetrahedra"][1][start:stop], start, worst_count, tolerance)
+
+
+def _share(stack: ExitStack, array: np.ndarray) -> tuple:
+    """
+    Copies the array into a new shared memory block, which is released when the stack closes
+    """
+    memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    stack.callback(memory.unlink)
+    stack.callback(memory.close)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)[...] = array
+    return memory.name, array.shape, array.dtype.str
+
+
+def parallel_statistics(coords: np.ndarray, tetrahedra: np.ndarray, processes: int = None,
+                        chunk_rows: int = QUALITY_CHUNK_ROWS, worst_count: int = WORST_COUNT,
+                        tolerance: float = 1e-10) -> dict:
+    """
+    chunk_statistics of the whole mesh computed by a process pool. Coordinates and tetrahedra are copied into
+    shared memory once, the tasks only carry element ranges and return the reduced statistics.
+    processes=1 runs the same ranges in this process, the reference for the parallel result.
+    Scripts using a pool need the if __name__ == "__main__" guard, the workers import the main module.
+    :param coords: node coordinates, shape (N, 3)
+    :param tetrahedra: node indices, shape (n, 4)
+    :param processes: pool size, None for the number of CPUs
+    :param chunk_rows: number of tetrahedra per task
+    """
+    coords = np.ascontiguousarray(coords, dtype=np.float64)
+    tetrahedra = np.ascontiguousarray(tetrahedra)
+    ranges = [(start, min(start + chunk_rows, len(tetrahedra))) for start in range(0, len(tetrahedra), chunk_rows)]
+    if not ranges:
+        return chunk_statistics(coords, tetrahedra, 0, worst_count, tolerance)
+    if processes == 1:
+        chunks = (chunk_statistics(coords, tetrahedra[start:stop], start, worst_count, tolerance)
+                  for start, stop in ranges)
+        return _reduce(chunks, worst_count)
+    with ExitStack() as stack:
+        specs = {"coords": _share(stack, coords), "tetrahedra": _share(stack, tetrahedra)}
+        with Pool(processes, initializer=_attach, initargs=(specs, worst_count, tolerance)) as pool:
+            return _reduce(pool.imap(_range_statistics, ranges), worst_count)
+
+
+def _reduce(chunks, worst_count: int) -> dict:
+    result = None
+    for statistics in chunks:
+        result = statistics if result is None else merge_statistics(result, statistics, worst_count)
+    return result
+
+
+def print_statistics(statistics: dict):
+    print(f"tetrahedra: {statistics['tetrahedra']}, inverted: {statistics['inverted']}, "
+          f"degenerate: {statistics['degenerate']}, non-Delaunay: {statistics['non_delaunay']}")
+    print(f"{statistics['control_volume']}\tVolume calculated from tetrahedra edge volumes")
+    print(f"{statistics['volume']}\tVolume from tetrahedra")
+    for name, (low, high) in statistics["extrema"].items():
+        print("{:<18} min: {:.4e}, max: {:.4e}".format(name, low, high))
+    for name, counts in statistics["histograms"].items():
+        edges = HISTOGRAM_BINS[name]
+        print(f"{name} histogram:")
+        for low, high, count in zip(edges[:-1], edges[1:], counts):
+            if count:
+                print("  [{:8.3f}, {:8.3f}) {:>10}".format(low, high, count))
+    for name, (values, index) in statistics["worst"].items():
+        print(f"worst {name}: " + ", ".join(f"{i}: {value:.4f}" for value, i in zip(values, index)))
+
+
+if __name__ == "__main__":
+    # python mesh_quality.py mesh.msh [processes], processes=1 gives the serial reference
+    convert = importlib.import_module("02_mesh_tetgen_and_convert")
+    mesh = convert.Gmsh() if sys.argv[1].endswith(".msh") else convert.Tetgen()
+    mesh.read_cached(sys.argv[1])
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    print_statistics(parallel_statistics(mesh.node_coords, mesh.node_index(mesh.tetrahedron_block.nodes),
+                                         processes))
@@ -0,0 +1,90 @@
+import importlib
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from multiprocessing.connection import wait
+
+# Runs independent devsim simulations in separate processes. devsim keeps its devices in global state of the
+# process, every job gets a fresh process, so jobs can neither see each other nor take each other down.
+# Workers are spawned and import the main module again, scripts using run_jobs need the __main__ guard.
+
+POLL_SECONDS = 0.1
+
+
+def _run(simulate, job: dict, connection):
+    start_time = time.perf_counter()
+    try:
+        arguments = {key: value for key, value in job.items() if key not in ("name", "timeout")}
+        result = {"status": "ok", "iv": simulate(**arguments)}
+    except BaseException:
+        result = {"status": "failed", "error": traceback.format_exc()}
+    result["seconds"] = time.perf_counter() - start_time
+    connection.send(result)
+    connection.close()
+
+
+def run_jobs(jobs: list, processes: int = None, timeout: float = None, simulate=None) -> list:
+    """
+    Runs each job in its own worker process, at most processes at a time.
+    :param jobs: list of dict with the keyword arguments of simulate, optional "name" and "timeout" (seconds)
+    :param processes: number of simultaneous workers, None for the number of CPUs
+    :param timeout: default time limit of a job in seconds, None for no limit
+    :param simulate: module level function run in the worker, diode_common.SimulateResistor if None
+    :return: one dict per job in order of jobs: name, status ("ok", "failed", "timeout"), seconds and
+             iv (result of simulate) or error (traceback or reason)
+    """
+    if simulate is None:
+        simulate = importlib.import_module("diode_common").SimulateResistor
+    context = multiprocessing.get_context("spawn")
+    processes = processes or os.cpu_count() or 1
+    pending = list(enumerate(jobs))
+    running = {}
+    results = [None] * len(jobs)
+    while pending or running:
+        while pending and len(running) < processes:
+            index, job = pending.pop(0)
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=_run, args=(simulate, job, sender), daemon=True)
+            process.start()
+            sender.close()
+            running[index] = (process, receiver, time.monotonic())
+
+        ready = wait([receiver for _, receiver, _ in running.values()], timeout=POLL_SECONDS)
+        for index, (process, receiver, start_time) in list(running.items()):
+            job_timeout = jobs[index].get("timeout", timeout)
+            if receiver in ready:
+                try:
+                    result = receiver.recv()
+                except EOFError:  # the worker died without a result, e.g. a crash in devsim
+                    process.join()
+                    result = {"status": "failed", "error": f"Worker exited with code {process.exitcode}"}
+            elif job_timeout is not None and time.monotonic() - start_time > job_timeout:
+                process.terminate()
+                result = {"status": "timeout", "error": f"Job exceeded {job_timeout} s"}
+            else:
+                continue
+            process.join()
+            receiver.close()
+            result.setdefault("seconds", time.monotonic() - start_time)
+            results[index] = {"name": jobs[index].get("name", str(index)), **result}
+            del running[index]
+    return results
+
+
+if __name__ == "__main__":
+    # parameter study of the resistor, doping values on the meshes of 03 at scaling 1 and 10
+    biases = [round(0.1 * i, 12) for i in range(1, 11)]
+    jobs = [{"name": f"{mesh} Donors={donors:.3e}", "mesh": f"./Out/nVolume_contacts_scaling_{mesh}.msh",
+             "donors": donors, "biases": biases}
+            for mesh in ("1", "10") for donors in (1.0 / 1.6 * 1e19, 2.0 / 1.6 * 1e19)]
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    for result in run_jobs(jobs, processes, timeout=600):
+        print(f"{result['name']:40}{result['status']:10}{result['seconds']:8.2f} s")
+        if result["status"] == "ok":
+            iv = result["iv"]
+            for bias, total in zip(iv["bias"], iv["total"][:, iv["contacts"].index("top")]):
+                print(f"    {bias:+.3e}\t{total:+.3e}")
+        else:
+            print(result["error"])
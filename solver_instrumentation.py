@@ -0,0 +1,136 @@
+import csv
+import json
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+# Wall time, Newton iterations, residual norms and peak memory of the phases of a devsim simulation,
+# written as JSON (complete residual traces) or CSV (one row per phase) to compare runs across mesh sizes.
+
+CSV_COLUMNS = ("phase", "start", "seconds", "iterations", "converged", "relative_error", "absolute_error",
+               "peak_rss_bytes", "nodes", "tetrahedra")
+
+
+def peak_rss_bytes():
+    """
+    :return: peak resident set size of this process in bytes, None if it can not be determined
+    """
+    try:
+        import resource
+    except ImportError:  # Windows
+        return _windows_peak_rss()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _windows_peak_rss():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(Counters)
+        get_process = ctypes.windll.kernel32.GetCurrentProcess
+        get_process.restype = wintypes.HANDLE
+        get_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+        get_memory_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(Counters), wintypes.DWORD]
+        if get_memory_info(get_process(), ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except (OSError, AttributeError):
+        pass
+    return None
+
+
+def solve_record(result: dict) -> dict:
+    """
+    Reduces the info of devsim solve(info=True) to the iteration count and the residual trace, the largest
+    relative and absolute error over all devices per Newton iteration
+    """
+    iterations = result["iterations"]
+    relative = [max(device["relative_error"] for device in iteration["devices"]) for iteration in iterations]
+    absolute = [max(device["absolute_error"] for device in iteration["devices"]) for iteration in iterations]
+    return {"converged": bool(result["converged"]), "iterations": len(iterations),
+            "relative_error": relative[-1] if relative else None, "absolute_error": absolute[-1] if absolute else None,
+            "relative_errors": relative, "absolute_errors": absolute}
+
+
+class SolverInstrumentation:
+    """
+    Collects one record per phase: phase name, start (seconds since creation), seconds, peak_rss_bytes,
+    for solves also converged, iterations, final and per iteration relative / absolute errors, plus any
+    details given to phase, e.g. the node count.
+    """
+    def __init__(self):
+        self.records = []
+        self.start_time = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str, **details):
+        """
+        Measures the enclosed block, the record is yielded to add details
+        """
+        record = {"phase": name, **details}
+        start_time = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["start"] = start_time - self.start_time
+            record["seconds"] = time.perf_counter() - start_time
+            record["peak_rss_bytes"] = peak_rss_bytes()
+            self.records.append(record)
+
+    def solve(self, name: str, check: bool = True, **solve_arguments) -> dict:
+        """
+        devsim solve with convergence info recorded as phase name
+        :param check: raise like solve without info if Newton does not converge
+        :return: the info of solve
+        """
+        import devsim
+        with self.phase(name) as record:
+            result = devsim.solve(info=True, **solve_arguments)
+            record.update(solve_record(result))
+        if check and not result["converged"]:
+            raise RuntimeError(f"Convergence failure in {name} after {record['iterations']} iterations")
+        return result
+
+    def write_json(self, file_name):
+        with open(file_name, "w") as fh:
+            json.dump({"phases": self.records}, fh, indent=1)
+
+    def write_csv(self, file_name):
+        """
+        One row per phase, the residual traces are only in the JSON output
+        """
+        with open(file_name, "w", newline="") as fh:
+            writer = csv.DictWriter(fh, CSV_COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(self.records)
+
+    def summary(self) -> str:
+        lines = ["{:<28}{:>10}{:>7}{:>13}{:>13}{:>10}".format("Phase", "Seconds", "Iter", "RelError", "AbsError",
+                                                              "Peak MB")]
+        for record in self.records:
+            errors = [f"{record[name]:13.3e}" if record.get(name) is not None else " " * 13
+                      for name in ("relative_error", "absolute_error")]
+            peak = record["peak_rss_bytes"]
+            lines.append("{:<28}{:10.4f}{:>7}{}{}{:>10}".format(
+                record["phase"][:27], record["seconds"], record.get("iterations", ""), *errors,
+                f"{peak / 2**20:.1f}" if peak is not None else ""))
+        solves = [record for record in self.records if "iterations" in record]
+        lines.append(f"Solves: {len(solves)}, Newton iterations: {sum(r['iterations'] for r in solves)}, "
+                     f"total seconds: {time.perf_counter() - self.start_time:.4f}")
+        return "\n".join(lines)
+
+
+def measured(instrumentation, name: str, **details):
+    """
+    instrumentation.phase if an instrumentation is given, otherwise a context that does nothing
+    """
+    return instrumentation.phase(name, **details) if instrumentation else nullcontext({})
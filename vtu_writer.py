@@ -0,0 +1,121 @@
+import sys
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+
+# Binary VTK XML unstructured grid (.vtu) files for ParaView and other viewers. All arrays go into one raw
+# appended data block, each array is written with a single write from its buffer, nothing is formatted per value.
+
+# VTK cell type per number of nodes of a cell: vertex, line, triangle, tetrahedron
+VTK_TYPE_PER_NODE_COUNT = {1: 1, 2: 3, 3: 5, 4: 10}
+VTK_DATA_TYPES = {"i1": "Int8", "u1": "UInt8", "i2": "Int16", "u2": "UInt16", "i4": "Int32", "u4": "UInt32",
+                  "i8": "Int64", "u8": "UInt64", "f4": "Float32", "f8": "Float64"}
+
+
+def _little_endian(values) -> np.ndarray:
+    """
+    :return: values as C-contiguous little endian array, bool as uint8. Only copies if needed.
+    """
+    values = np.asarray(values)
+    if values.dtype == bool:
+        values = values.view(np.uint8)
+    if values.dtype.byteorder == ">" or (values.dtype.byteorder == "=" and sys.byteorder == "big"):
+        values = values.astype(values.dtype.newbyteorder("<"))
+    return np.ascontiguousarray(values)
+
+
+def _data_array(name: str, values: np.ndarray, offset: int) -> str:
+    kind = f"{values.dtype.kind}{values.dtype.itemsize}"
+    if kind not in VTK_DATA_TYPES:
+        raise ValueError(f"Unsupported dtype of {name}! Expected:{', '.join(VTK_DATA_TYPES)}, Value:{values.dtype}")
+    components = values.shape[1] if values.ndim > 1 else 1
+    return (f'<DataArray type="{VTK_DATA_TYPES[kind]}" Name={quoteattr(name)} NumberOfComponents="{components}" '
+            f'format="appended" offset="{offset}"/>')
+
+
+def write_vtu(file_name, coords: np.ndarray, cells: np.ndarray, point_data: dict = None, cell_data: dict = None,
+              cell_type: int = None):
+    """
+    Writes an unstructured grid of one cell type with raw appended binary data
+    :param file_name: path of the .vtu file
+    :param coords: node coordinates, shape (N, 3)
+    :param cells: node indices (starting at 0) per cell, shape (M, nodes per cell)
+    :param point_data: {name: values} with values of shape (N,) or (N, components)
+    :param cell_data: {name: values} with values of shape (M,) or (M, components)
+    :param cell_type: VTK cell type, derived from the nodes per cell if None
+    """
+    coords = _little_endian(coords).astype("<f8", copy=False)
+    cells = _little_endian(cells)
+    nodes_per_cell = cells.shape[1]
+    if cell_type is None:
+        cell_type = VTK_TYPE_PER_NODE_COUNT[nodes_per_cell]
+    sections = {"PointData": [], "CellData": []}
+    for section, data, count in (("PointData", point_data, len(coords)), ("CellData", cell_data, len(cells))):
+        for name, values in (data or {}).items():
+            values = _little_endian(values)
+            if len(values) != count:
+                raise ValueError(f"{section} {name} does not match the mesh! Expected:{count}, Value:{len(values)}")
+            sections[section].append((name, values))
+    sections["Points"] = [("Points", coords)]
+    sections["Cells"] = [("connectivity", cells.reshape(-1)),
+                         ("offsets", np.arange(nodes_per_cell, nodes_per_cell * len(cells) + 1, nodes_per_cell,
+                                               dtype="<i8")),
+                         ("types", np.full(len(cells), cell_type, dtype=np.uint8))]
+
+    # every appended array is preceded by its size in bytes as UInt64, offsets count from the leading "_"
+    lines = ['<?xml version="1.0"?>',
+             '<VTKFile type="UnstructuredGrid" version="1.0" byte_order="LittleEndian" header_type="UInt64">',
+             "  <UnstructuredGrid>",
+             f'    <Piece NumberOfPoints="{len(coords)}" NumberOfCells="{len(cells)}">']
+    arrays, offset = [], 0
+    for section in ("PointData", "CellData", "Points", "Cells"):
+        lines.append(f"      <{section}>")
+        for name, values in sections[section]:
+            lines.append("        " + _data_array(name, values, offset))
+            arrays.append(values)
+            offset += 8 + values.nbytes
+        lines.append(f"      </{section}>")
+    lines += ["    </Piece>", "  </UnstructuredGrid>", '  <AppendedData encoding="raw">', "   _"]
+
+    with open(file_name, "wb") as fh:
+        fh.write("\n".join(lines).encode())
+        for values in arrays:
+            fh.write(np.array(values.nbytes, dtype="<u8").tobytes())
+            fh.write(values.data)
+        fh.write(b"\n  </AppendedData>\n</VTKFile>\n")
+
+
+def mesh_vtu(file_name, mesh, point_data: dict = None, cell_data: dict = None):
+    """
+    Writes the tetrahedra of a converter mesh (see 02_mesh_tetgen_and_convert), cell_data in order of the
+    tetrahedron_block
+    """
+    write_vtu(file_name, mesh.node_coords, mesh.node_index(mesh.tetrahedron_block.nodes), point_data, cell_data)
+
+
+def device_vtu(file_name, device: str, region: str, node_models=(), element_models=()):
+    """
+    Writes the elements of a devsim region with node models as point data and element models as cell data.
+    Element edge models are averaged over the edges of each element. For a name without element model the
+    components name_x, name_y, name_z of element_from_edge_model are written as one vector.
+    :param node_models: names of node models, e.g. Potential
+    :param element_models: names of element models or edge models converted by element_from_edge_model,
+                           e.g. ElectricField
+    """
+    import devsim
+    coords = np.column_stack([devsim.get_node_model_values(device=device, region=region, name=axis)
+                              for axis in "xyz"])
+    cells = np.array(devsim.get_element_node_list(device=device, region=region), dtype=np.int32)
+    point_data = {name: np.asarray(devsim.get_node_model_values(device=device, region=region, name=name))
+                  for name in node_models}
+    available = devsim.get_element_model_list(device=device, region=region)
+    cell_data = {}
+    for name in element_models:
+        components = [name] if name in available else [f"{name}_{axis}" for axis in "xyz" if f"{name}_{axis}" in
+                                                       available]
+        if not components:
+            raise ValueError(f"{name} is not an element model of {device} {region}, run element_from_edge_model")
+        values = [np.asarray(devsim.get_element_model_values(device=device, region=region, name=component))
+                  .reshape(len(cells), -1).mean(axis=1) for component in components]
+        cell_data[name] = values[0] if len(values) == 1 else np.column_stack(values)
+    write_vtu(file_name, coords, cells, point_data, cell_data)